@@ -1,257 +1,376 @@
 from email import header
-import json
+import cProfile
+import io
+import pstats
 import os
 from pathlib import Path
 import random
 import re
 import sys
-import time
 from datetime import datetime
 
 
 from PyQt6.QtCore import QSize, Qt
-from PyQt6.QtCore import QAbstractTableModel, Qt, QVariant
-from PyQt6.QtCore import QObject, pyqtSignal, QThread, QTimer
+from PyQt6.QtCore import QAbstractTableModel, QItemSelection, QItemSelectionModel, QModelIndex, Qt, QVariant
+from PyQt6.QtCore import QObject, pyqtSignal, QThread, QTimer, QFileSystemWatcher
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QPushButton,
-    QVBoxLayout, QLineEdit, QLabel, QFileDialog, QWidget, QCheckBox, QDialog, QHBoxLayout ,QMessageBox, QPlainTextEdit, QProgressBar
+    QVBoxLayout, QLineEdit, QLabel, QFileDialog, QWidget, QCheckBox, QDialog, QHBoxLayout ,QMessageBox, QPlainTextEdit, QProgressBar,
+    QAbstractItemView, QListWidget, QListWidgetItem
 )
-from PyQt6.QtGui import QColor
+from PyQt6.QtGui import QColor, QStandardItem, QStandardItemModel
 from PyQt6.QtWidgets import QTableView
-from openpyxl import load_workbook
 import pandas as pd
 
 from EI_protocols_utils.utils.constants import *
-from EI_protocols_utils.utils.weather import get_weather, add_weather
 from EI_protocols_utils.utils.exchanges import RequiredFieldsError, RowError
-from EI_protocols_utils.utils.models import Journal, WaterMeterProtocol
 from EI_protocols_utils.utils.settings import settings
-from EI_protocols_utils.utils.user_info import save_paths, load_paths
+from core.catalog import protocol_catalog
+from core.checkpoint import RunCheckpoint
+from core.backends import get_backend
+from core.display import DisplayCache
+from core.prevalidation import dry_run
+from core.records import JOURNAL_FIELDS, JournalRecord, field_titles
+from core.journal_reader import JournalReader
+from core.journal_sync import diff_journal, row_fingerprints, row_runs
+from core.measurements import flow_range_text
+from core.output_cache import OutputCache, final_kwargs, protocol_key
+from core.render import render_protocols
+from core.scheduler import cost_model, estimate_remaining, schedule_jobs
+from core.run_log import RunLog
+from core.row_colors import DARKCYAN, GREEN, RED, RowColorEngine, name_substrings
+from core.settings_store import load_paths, save_paths
+from core.search_index import SEARCH_COLUMNS, SearchIndex, column_values, row_texts, texts_from_values
+from core.snapshot import load_journal_frame
+from core.templates import template_registry
+from core.tracing import Tracer
+from core.weather import weather_store
+from core.writeback import JournalWriter
 data = load_paths(filename=settings.user_info_path)
 
-# Работа со средним выполнением протоколов
-TIME_STATS_FILE = Path(settings.protocol_times_path)
-MAX_HISTORY = 50  # будем хранить 50 последних значений
-
-if TIME_STATS_FILE.exists():
-    with open(TIME_STATS_FILE, "r") as f:
-        times_data=json.load(f)
-        times = times_data['times']
-else:
-    times = []
+# Трассы прогонов и профили cProfile
+TRACES_DIR = Path(getattr(settings, "traces_path", "data/traces"))
+# Полные логи прогонов; в окне видны только последние строки
+LOGS_DIR = Path(getattr(settings, "logs_path", "data/logs"))
+LOG_INTERVAL_MS = 100
+# Через сколько после последнего изменения файла журнала сверять таблицу с ним
+JOURNAL_SYNC_DELAY_MS = 500
+# Настройки приложения, которые есть всегда, даже если их еще нет в файле
+APP_SETTINGS_DEFAULTS = {"profile_protocols": False}
+SETTING_LABELS = {"profile_protocols": "Профилировать создание протоколов (cProfile)"}
 
 class ProtocolWorker(QObject):
-    progress = pyqtSignal(int)         # процент
-    message = pyqtSignal(str)          # лог в консоль
-    finished = pyqtSignal(list, list, list)  # completed, errors, notcomplited
-    eta = pyqtSignal(float)             # сигнал оставшегося времени в секундах
+    finished = pyqtSignal(list, list, list, list)  # completed, errors, notcomplited, созданные в этом прогоне
+    # Сообщения, прогресс, оставшееся время и измененные строки окно забирает из self.log пачками
     
-    required_fields = [0, 2, 5, 7, 9, 12, 13, 21, 32, 35, 45]
+    required_fields = ["protocol_id", "register_number", "name", "serial", "date", "si_numbers",
+                       "result", "method", "address", "verifier", "readings"]
 
-    def __init__(self, workbook, from_row, to_row, protocols_path, journal_path):
+    def __init__(self, reader, from_row, to_row, protocols_path, journal_path, workers=1, resume=False):
         super().__init__()
-        self.workbook = workbook
-        self.wsheet = workbook[JOURNAL_WORKSHEET]
+        self.reader = reader
+        self.resume = resume
         self.from_row = from_row
         self.to_row = to_row
         self.protocols_path = protocols_path
         self.journal_path = journal_path
+        self.workers = workers
+        # Итог прогона для finished: (готовые, ошибки, не созданные, созданные в этом прогоне)
+        self.result = ([], [], [], [])
+        # Имя файлов прогона (лог, трасса, профиль): с долями секунды, чтобы прогоны не затирали друг друга
+        self.run_id = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        # Лог прогона: полный - в файл, в окно - пачками по таймеру
+        self.log = RunLog(LOGS_DIR / f"{self.run_id}.log",
+                          max_lines=getattr(settings, "console_max_lines", 2000))
+        # Манифест прогона: по нему после падения продолжаем с недоделанных строк
+        self.checkpoint = RunCheckpoint(journal_path)
+        # Готовые протоколы по хэшу входных данных и шаблона
+        self.cache = OutputCache(protocols_path)
+        # Время стадий по строкам; выгружается в конце прогона
+        self.tracer = Tracer()
+        self.profile = load_paths(filename=settings.app_settings_path).get("profile_protocols", False)
+        # Журнал сохраняется пачками, а не после каждой строки
+        self.writer = JournalWriter(
+            journal_path,
+            flush_rows=getattr(settings, "journal_flush_rows", 50),
+            flush_seconds=getattr(settings, "journal_flush_seconds", 30),
+            tracer=self.tracer,
+        )
         
-    def validate_row(self, row: list) -> list:
+    def validate_row(self, record: JournalRecord) -> JournalRecord:
         # Выводим пропущенные обязательные поля
-        missing_fields = []
-        for index in self.required_fields:
-            if not row[index]:
-                missing_fields.append(index)
-        
-        cells_names = {}
-        first_row = self.wsheet[1] # Нумерация в openpyxl с 1
-        for index in self.required_fields:
-            field_name = first_row[index].value
-            cells_names[index] = field_name
+        missing_fields = [field for field in self.required_fields if not getattr(record, field)]
         
         if missing_fields:
             # Получаем названия пропущенных полей
-            missing_field_names = [cells_names[index] for index in missing_fields]
+            missing_field_names = [self.titles[field] for field in missing_fields]
             # Формируем человекочитаемую строку
             missing_field_list = ", ".join(missing_field_names)
-            raise RequiredFieldsError(f"Пропущены поля: {missing_field_list}", missing_fields)
-
-        row[1] = '1' if not row[1] else str(row[1])
-        
-        # Если не указана погода, то создаем или берем из журнала погоды
-        if not row[14] or not row[15] or not row[16]:
-            date_str = row[9].strftime("%d.%m.%Y") if type(row[9]) is not str else row[9]
-            weather = get_weather(date_str)
-            if weather and (not row[14] or not row[15] or not row[16]):
-                row[14] = weather["temperature"] + ' °C'
-                row[15] = weather["pressure"] + ' кП'
-                row[16] = weather["humidity"] + ' %'
-                if not get_weather(date_str):
-                    add_weather(date_str, row[14], row[15], row[16])  # Обновляем журнал погоды
-            else:
-                # Если погоды нет, то генерируем случайные значения и сохраняем в журнал погоды
-                temperature = str(round(random.uniform(settings.temperatures["min"], settings.temperatures["max"]), 1))
-                pressure = str(round(random.uniform(settings.pressure["min"], settings.pressure["max"]), 1))
-                humidity = str(round(random.uniform(settings.humdity["min"], settings.humdity["max"]), 1))
-                add_weather(date_str, temperature, pressure, humidity)
-                row[14] = temperature + ' °C'
-                row[15] = pressure + ' кП'
-                row[16] = humidity + ' %'
+            raise RequiredFieldsError(f"Пропущены поля: {missing_field_list}",
+                                      [JOURNAL_FIELDS[field] for field in missing_fields])
 
-        row[34] = '1' if not row[34] else str(row[34])
+        record.copies = '1' if not record.copies else str(record.copies)
+        record.sheets = '1' if not record.sheets else str(record.sheets)
+        
+        if not record.owner: record.owner = "Частное лицо"
+
+        return record
+
+    def prepare_row(self, record: JournalRecord) -> dict:
+        """Проверяет строку и собирает параметры протокола."""
+        # Проверяем и дополняем данные
+        with self.tracer.span("validate", record.row_number):
+            self.validate_row(record)
+        # Если не указана погода, то берем из журнала погоды или генерируем
+        with self.tracer.span("weather", record.row_number):
+            weather_store.fill_record(record)
+        
+        temperature_str = re.sub(r"[^0-9.]", "", str(record.temperature).replace(',', '.'))
+        pressure_str = re.sub(r"[^0-9.]", "", str(record.pressure).replace(',', '.'))
+        humidity_str = re.sub(r"[^0-9.]", "", str(record.humidity).replace(',', '.'))
+        readings_str = re.sub(r"[^0-9.]", "", str(record.readings).replace(',', '.'))
+        
+        temperature_float = round(float(temperature_str), 1)
+        pressure_float = round(float(pressure_str), 1)
+        humidity_float = round(float(humidity_str), 1)
+        readings_float = round(float(readings_str), 3)
         
-        if not row[47]: row[47] = "Частное лицо"
+        register_year_2d = int(record.register_number.split('-')[-1])
 
-        return row
+        if register_year_2d <= 25:
+            register_year = 2000 + register_year_2d
+        else:
+            register_year = 1900 + register_year_2d
+
+        if not record.year:
+            year = random.randint(register_year, 2025)
+            record.year = year
+        else:
+            year = int(record.year)
+        
+        second_number = None
+        if record.flow_range:
+            match = re.search(r'\(([^-]+)-([^)]+)\)', record.flow_range) 
+            second_number = float(match.group(2).replace(',', '.'))
+
+        # исходная дата
+        date_str = record.date.strftime("%d.%m.%Y") if type(record.date) is not str else record.date
+        # парсим дату
+        dt = datetime.strptime(date_str, "%d.%m.%Y")
+        # папка вида 2026-01
+        month_folder = dt.strftime("%Y-%m")
+        # полный путь
+        month_dir = os.path.join(self.protocols_path, month_folder)
+        # создаём папку если нет
+        os.makedirs(month_dir, exist_ok=True)
+
+        # Параметры протокола (словарь, чтобы передать его в процесс пула)
+        return dict(
+            dir_path=month_dir,
+            tab_number=settings.tab_numbers.get(record.verifier, record.protocol_id.split('-')[2]),
+            protocol_number=record.protocol_id.split('-')[-1],
+            date=date_str,
+            next_date="0000",
+            #next_date=record.next_date.strftime("%d.%m.%Y") if type(record.next_date) is not str else record.next_date,
+            SI_numbers=record.si_numbers,
+            suitability=False if record.result=="Непригодно" else True,
+            reasons_for_unsuitability=record.reasons,
+            name=record.name,
+            number=record.serial,
+            register_number=record.register_number,
+            year=year,
+            owner=record.owner if record.owner else "Частное лицо",
+            address=record.address,
+            temperature=temperature_float,
+            pressure=pressure_float,
+            humidity=humidity_float,
+            readings=readings_float,
+            unit_type=record.unit_type,
+            range=str(second_number) if second_number else None
+        )
 
     def run(self):
-        global times
+        profiler = None
+        if self.profile:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            self.process()
+        except Exception as e:
+            # Например, журнал открыт в Excel: окно не должно ждать вечно
+            self.log.write(f"❌Прогон прерван: {type(e).__name__}: {e}")
+        finally:
+            if profiler:
+                profiler.disable()
+            self.export_trace(profiler)
+            # Замеры времени по шаблонам - для оценки следующих прогонов
+            cost_model.save()
+            self.log.close()
+        self.finished.emit(*self.result)
+
+    def export_trace(self, profiler=None):
+        """Трасса прогона в JSON-lines, сводка p50/p95 в консоль и, если включено, профиль cProfile."""
+        try:
+            trace_path = self.tracer.export(TRACES_DIR / f"{self.run_id}.jsonl")
+            self.log.write(f"\n⏱️Время по стадиям:\n{self.tracer.summary_table()}\nТрасса: {trace_path}")
+            if profiler:
+                profile_path = TRACES_DIR / f"{self.run_id}.prof"
+                profiler.dump_stats(profile_path)
+                top = io.StringIO()
+                pstats.Stats(profiler, stream=top).sort_stats("cumulative").print_stats(15)
+                # В пуле процессов создание протоколов идет в других процессах и в профиль не попадает
+                self.log.write(f"Профиль: {profile_path}\n{top.getvalue()}")
+        except OSError as e:
+            self.log.write(f"⚠️Не удалось сохранить трассу: {e}")
+
+    def process(self):
         errors = []
         completed = []
         not_completed = []
-
-        total_count = self.to_row - self.from_row 
-
-        for i, row in enumerate(self.wsheet.iter_rows(min_row=self.from_row, max_row=self.to_row, values_only=False)):
+        # Только созданные сейчас - их можно удалить при отказе; готовые из кэша и прошлых прогонов - нет
+        created = []
+        # Если прогон прервется, окно получит то, что успели сделать
+        self.result = (completed, errors, not_completed, created)
+
+        def row_failed(e, row_number):
+            errors.append(RowError(e, row_number))
+            not_completed.append(row_number)
+            self.log.write(f"❌Ошибка: {e}, строка {row_number}\n")
+
+        # Несохраненное в прошлый раз - в книгу, здесь, а не в GUI-потоке: это полная загрузка и сохранение
+        if self.writer.recover():
+            self.log.write(f"♻️Восстановлены несохраненные изменения журнала: {self.writer.recovered} строк")
+
+        # Заголовок читаем один раз - из него берутся названия полей для ошибок
+        self.titles = field_titles(self.reader.header())
+
+        records = self.reader.iter_records(self.from_row, self.to_row)
+        records = list(self.tracer.iter("read", records, self.from_row))
+
+        state = self.checkpoint.load() if self.resume else None
+        if state:
+            # Готовые строки прошлого прогона не создаем заново, их изменения уже в журнале
+            finished = self.checkpoint.completed_rows(state)
+            lost = len(state["done"]) - len(finished)
+            self.log.write(
+                f"⏯️Продолжаем прогон от {state['started']}: готово строк {len(finished)}"
+                + (f", у {lost} пропали файлы - создадим заново" if lost else "")
+            )
+            completed.extend(finished[row_number] for row_number in sorted(finished))
+            records = [record for record in records if record.row_number not in finished]
+        else:
+            self.checkpoint.start(self.from_row, self.to_row, self.protocols_path)
+
+        # Весь диапазон проверяется разом до создания первого протокола
+        with self.tracer.span("dry-run"):
+            report = dry_run(records, self.titles, self.required_fields)
+        if report.errors or report.warnings:
+            self.log.write(f"🔎{report.text()}\n")
+
+        # Проверяем строки здесь, в пул уходят только готовые параметры протоколов
+        rows = {}
+        outputs = {}  # номер строки -> (xlsx, pdf)
+        templates = {}  # номер строки -> хэш шаблона
+        template_names = {}  # номер строки -> имя файла шаблона
+        jobs = []
+        backend = get_backend().name
+
+        def write_row(row_number):
+            """Передаем в журнал только измененные ячейки - сразу, как строка готова: ячейки адресуются номером строки."""
+            changes = rows[row_number].changes()
+            self.writer.update_row(row_number, changes)
+            # Строка готова, только когда ее изменения уже в журнале изменений
+            self.checkpoint.mark_done(row_number, *outputs[row_number], changes)
+            self.log.row_updated(row_number, changes)
+
+        for record in records:
+            row_number = record.row_number
+            if row_number in report.errors:
+                errors.append(RowError(ValueError("; ".join(report.errors[row_number])), row_number))
+                not_completed.append(row_number)
+                continue
             try:
-                # Преобразуем к значениям для работы
-                values = [cell.value for cell in row]
-
-                # for index, value in enumerate(values):
-                #     print(f"{index}: {value}")
-
-                # Проверяем и дополняем данные
-                self.validate_row(values)
-                
-                temperature_str = re.sub(r"[^0-9.]", "", str(values[14]).replace(',', '.'))
-                pressure_str = re.sub(r"[^0-9.]", "", str(values[15]).replace(',', '.'))
-                humidity_str = re.sub(r"[^0-9.]", "", str(values[16]).replace(',', '.'))
-                readings_str = re.sub(r"[^0-9.]", "", str(values[45]).replace(',', '.'))
-                
-                temperature_float = round(float(temperature_str), 1)
-                pressure_float = round(float(pressure_str), 1)
-                humidity_float = round(float(humidity_str), 1)
-                readings_float = round(float(readings_str), 3)
-                
-                register_year_2d = int(values[2].split('-')[-1])
-
-                if register_year_2d <= 25:
-                    register_year = 2000 + register_year_2d
-                else:
-                    register_year = 1900 + register_year_2d
-
-                if not values[44]:
-                    year = random.randint(register_year, 2025)
-                    values[44] = year
-                else:
-                    year = int(values[44])
-                
-                second_number = None
-                if values[41]:
-                    match = re.search(r'\(([^-]+)-([^)]+)\)', values[41]) 
-                    second_number = float(match.group(2).replace(',', '.'))
-
-                # исходная дата
-                date_str = values[9].strftime("%d.%m.%Y") if type(values[9]) is not str else values[9]
-                # парсим дату
-                dt = datetime.strptime(date_str, "%d.%m.%Y")
-                # папка вида 2026-01
-                month_folder = dt.strftime("%Y-%m")
-                # полный путь
-                month_dir = os.path.join(self.protocols_path, month_folder)
-                # создаём папку если нет
-                os.makedirs(month_dir, exist_ok=True)
-
-                # Создаем протокол
-                protocol = WaterMeterProtocol(
-                    dir_path=month_dir,
-                    tab_number=settings.tab_numbers.get(values[35], values[0].split('-')[2]),
-                    protocol_number=values[0].split('-')[-1],
-                    date=date_str,
-                    next_date="0000",
-                    #next_date=values[10].strftime("%d.%m.%Y") if type(values[10]) is not str else values[10],
-                    SI_numbers=values[12],
-                    suitability=False if values[13]=="Непригодно" else True,
-                    reasons_for_unsuitability=values[38],
-                    name=values[5],
-                    number=values[7],
-                    register_number=values[2],
-                    year=year,
-                    owner=values[47] if values[47] else "Частное лицо",
-                    address=values[32],
-                    temperature=temperature_float,
-                    pressure=pressure_float,
-                    humidity=humidity_float,
-                    readings=readings_float,
-                    unit_type=values[48],
-                    range=str(second_number) if second_number else None
-                )
-                
-                start = time.perf_counter()
-                xlsx_path, pdf_path = protocol.create()
-                end = time.perf_counter()
-
-                elapsed = end - start
-                times.append(elapsed)
-                if len(times) > MAX_HISTORY:
-                    times = times[-MAX_HISTORY:]
-
-                # сохраняем обратно
-                with open(TIME_STATS_FILE, "w") as f:
-                    json.dump({"times": times}, f)
-                    
-                avg_time = sum(times) / len(times)
-                remaining = avg_time * (total_count - i)
-
-                self.eta.emit(remaining)               # отправляем оставшееся время в диалог
-                self.progress.emit(int(i / total_count * 100))
+                protocol_kwargs = self.prepare_row(record)
+                template = template_registry.find(protocol_kwargs["register_number"], protocol_kwargs["name"])
+                templates[row_number] = template_registry.digest(template)
+                template_names[row_number] = template.name
+                rows[row_number] = record
+            except Exception as e:
+                row_failed(e, row_number)
+                continue
+            # Данные и шаблон не менялись с прошлого раза - протокол уже готов
+            cached = self.cache.get(protocol_key(protocol_kwargs, templates[row_number], backend))
+            if cached:
+                completed.append(cached)
+                outputs[row_number] = cached
+                write_row(row_number)
+                self.log.write(f"♻️Строка {row_number} не изменилась, протокол уже есть: {cached[0]}")
+            else:
+                jobs.append((row_number, protocol_kwargs))
+
+        # Новая погода за весь пакет сохраняется одним разом
+        weather_store.flush()
+
+        # Строки одного шаблона подряд, при нескольких процессах - долгие первыми
+        jobs = schedule_jobs(jobs, template_names, cost_model, self.workers)
+        total_count = len(jobs)
+        job_kwargs = dict(jobs)
+        # Оценка каждого задания по модели; уточняется замерами по ходу прогона
+        pending = dict.fromkeys(row_number for row_number, _ in jobs)
+
+        def emit_eta():
+            estimates = {}  # (шаблон, задан ли диапазон) -> секунды
+            costs = []
+            for row_number in pending:
+                kwargs = job_kwargs[row_number]
+                key = (template_names[row_number], bool(kwargs.get("range")))
+                if key not in estimates:
+                    estimates[key] = cost_model.estimate(key[0], kwargs)
+                costs.append(estimates[key])
+            self.log.set_eta(estimate_remaining(costs, self.workers))
+
+        emit_eta()
+        for done, (row_number, result, error) in enumerate(render_protocols(jobs, self.workers), start=1):
+            record = rows[row_number]
+            pending.pop(row_number, None)
+            try:
+                if error:
+                    raise error
+                xlsx_path, pdf_path, timings, measurements = result
+                for stage, seconds in timings.items():
+                    self.tracer.add(stage, row_number, seconds)
+                cost_model.add(template_names[row_number], timings)
 
                 completed.append((xlsx_path, pdf_path))
-                self.message.emit(f"✅Создан протокол: {xlsx_path}")
-
-                ready_protocol = load_workbook(filename=xlsx_path, data_only=True) # Без data_only=False будут формулы
-                ready_wsheet = ready_protocol[WATER_METER_PROTOTOCOL_SEETNAME]
-                
-                if values[41]:
-                    pass
-                else:
-                    if "Измерения на расходе Qнаиб , л/ч" in str(ready_wsheet["B55"].value):
-                        consumption=max(float(ready_wsheet["AC55"].value), float(ready_wsheet["AC54"].value), float(ready_wsheet["AC53"].value))
-                    elif "Измерения на расходе Qнаиб , л/ч" in ready_wsheet["B59"].value:
-                        consumption=max(float(ready_wsheet["AC61"].value), float(ready_wsheet["AC60"].value), float(ready_wsheet["AC59"].value))
-                    else:
-                        raise Exception("Не удалось определить максимальный расход из протокола"\
-                            "Убедитесь, что шаблон протокола содержит результаты расхода измерений в B53-B55, или AC59-AC61")
-                    
-                    values[41] = f"Поверен в диапазоне расхода (0,03-{round(consumption, 3)}) м3/ч"
-                    
-                for i, cell in enumerate(row):
-                    cell.value = values[i]
+                created.append((xlsx_path, pdf_path))
+                outputs[row_number] = (xlsx_path, pdf_path)
+                self.log.write(f"✅Создан протокол: {xlsx_path}")
+
+                if measurements:
+                    record.flow_range = flow_range_text(measurements["max_flow"])
+                key_kwargs = final_kwargs(job_kwargs[row_number], measurements)
+                input_hash = protocol_key(key_kwargs, templates[row_number], backend)
+                self.cache.put(input_hash, xlsx_path, pdf_path)
+                protocol_catalog.add(key_kwargs, xlsx_path, pdf_path, input_hash, self.journal_path, row_number)
                     
             except Exception as e:
-                errors.append(RowError(e, i+self.from_row))
-                not_completed.append(i+self.from_row)
-                self.message.emit(f"❌Ошибка: {e}, строка {i+self.from_row}\n")
-                #raise e
-            except RequiredFieldsError as rfe:
-                not_completed.append(i+self.from_row)
-                errors.append(RowError(rfe, i+self.from_row))
-                self.message.emit(f"❌Ошибка: {rfe}, строка {i+self.from_row}\n")
-                
-            self.workbook.save(filename=self.journal_path)
+                row_failed(e, row_number)
+            else:
+                write_row(row_number)
+
+            emit_eta()                                 # отправляем оставшееся время в диалог
 
             # обновляем прогресс
-            try:
-                progress_percent = int(i / total_count * 100)
-            except ZeroDivisionError:
-                progress_percent = 100
-            self.progress.emit(progress_percent)
+            self.log.set_progress(int(done / total_count * 100))
 
-        self.finished.emit(completed, errors, not_completed)
+        self.writer.close()
+        self.cache.save()
+        self.checkpoint.finish()
+        self.log.set_progress(100)
+        self.result = (completed, errors, not_completed, created)
 
 class CreateProtocolDialog(QDialog):
-    def __init__(self, journal_path, protocols_path, from_row, to_row):
+    def __init__(self, journal_path, protocols_path, from_row, to_row, on_row_updated=None, resume=False):
         super().__init__()
         
         self.journal_path = journal_path
@@ -259,9 +378,6 @@ class CreateProtocolDialog(QDialog):
         self.from_row = from_row
         self.to_row = to_row
         
-        self.workbook = load_workbook(filename=self.journal_path)
-        self.wsheet = self.workbook[JOURNAL_WORKSHEET]
-        
         self.setWindowTitle("Создание протоколов")
         self.setFixedSize(QSize(500, 500))
         self.main_layout = QVBoxLayout(self)
@@ -272,6 +388,7 @@ class CreateProtocolDialog(QDialog):
         self.console.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
         self.console.setFixedSize(QSize(480, 400))
         self.console.setReadOnly(True)
+        self.console.setMaximumBlockCount(getattr(settings, "console_max_lines", 2000))
         self.main_layout.addWidget(self.console)
         
         # ---- Прогрессбар ----
@@ -281,9 +398,10 @@ class CreateProtocolDialog(QDialog):
         self.progress.setFixedSize(QSize(480, 30))
         self.main_layout.addWidget(self.progress)
         
-        self.workbook = load_workbook(journal_path)
+        self.reader = JournalReader(journal_path)
         self.worker_thread = QThread()
-        self.worker = ProtocolWorker(self.workbook, from_row, to_row, protocols_path, journal_path)
+        self.worker = ProtocolWorker(self.reader, from_row, to_row, protocols_path, journal_path,
+                                     workers=getattr(settings, "protocol_workers", 1), resume=resume)
         self.worker.moveToThread(self.worker_thread)
         
         # label
@@ -293,30 +411,52 @@ class CreateProtocolDialog(QDialog):
 
         # сигналы
         self.worker_thread.started.connect(self.worker.run)
-        self.worker.progress.connect(self.progress.setValue)
-        self.worker.message.connect(self.console.appendPlainText)
         self.worker.finished.connect(self.on_finished)
         self.worker.finished.connect(self.worker_thread.quit)
         self.worker.finished.connect(self.worker.deleteLater)
         self.worker_thread.finished.connect(self.worker_thread.deleteLater)
-        self.worker.eta.connect(self.update_eta_label)
+
+        # Лог, прогресс и строки журнала - одной пачкой раз в LOG_INTERVAL_MS
+        self.run_log = self.worker.log
+        self.on_row_updated = on_row_updated
+        self.log_timer = QTimer(self)
+        self.log_timer.setInterval(LOG_INTERVAL_MS)
+        self.log_timer.timeout.connect(self.drain_log)
+        self.log_timer.start()
 
         self.worker_thread.start()
+
+    def drain_log(self):
+        batch = self.run_log.drain()
+        if batch["dropped"]:
+            self.console.appendPlainText(f"... пропущено сообщений: {batch['dropped']}, полный лог: {self.run_log.path}")
+        if batch["lines"]:
+            self.console.appendPlainText("\n".join(batch["lines"]))
+        if batch["progress"] is not None:
+            self.progress.setValue(batch["progress"])
+        if batch["eta"] is not None:
+            self.update_eta_label(batch["eta"])
+        if self.on_row_updated:
+            for row_number, changes in batch["rows"]:
+                self.on_row_updated(row_number, changes)
         
     def update_eta_label(self, remaining_seconds):
         mins, secs = divmod(int(remaining_seconds), 60)
         self.eta_label.setText(f"Осталось ~{mins} мин {secs} сек")
         
-    def on_finished(self, completed, errors, not_completed):
+    def on_finished(self, completed, errors, not_completed, created):
         self.completed_protocols = completed
+        self.created_protocols = created
         self.error_protocols = errors
-        self.console.appendPlainText("🧩Создание протоколов завершено!")        
-        self.console.appendPlainText(f"🧩Выполнены успешно ({len(completed)}): \n")
-        for item in completed:
-            self.console.appendPlainText(f" - {item[0].name}, {item[1].name}")
-        self.console.appendPlainText(f"\n⚠️С ошибками ({len(errors)}): ")
-        for error in errors:
-            self.console.appendPlainText(f" - {error}, строка {error.row_number}")
+        # Забираем то, что поток успел записать после последнего срабатывания таймера
+        self.log_timer.stop()
+        self.drain_log()
+        lines = ["🧩Создание протоколов завершено!", f"🧩Выполнены успешно ({len(completed)}): \n"]
+        lines += [f" - {item[0].name}, {item[1].name}" for item in completed]
+        lines.append(f"\n⚠️С ошибками ({len(errors)}): ")
+        lines += [f" - {error}, строка {error.row_number}" for error in errors]
+        lines.append(f"\nПолный лог: {self.run_log.path}")
+        self.console.appendPlainText("\n".join(lines))
             
         if errors:
             self.question_label = QLabel(f"Возникли ошибки, сохранить протоколы?")
@@ -332,7 +472,8 @@ class CreateProtocolDialog(QDialog):
     def yes_button_clicked(self):
         self.accept()
     def no_button_clicked(self):
-        for item in self.completed_protocols:
+        # Протоколы, взятые из кэша или прошлого прогона, остаются
+        for item in self.created_protocols:
             self.console.appendPlainText(f"Удаляем протоколы: {item[0].name}, {item[1].name}")
             os.remove(item[0])
             os.remove(item[1])
@@ -350,10 +491,10 @@ class SettingsDialog(QDialog):
         self.setFixedSize(QSize(300, 200))
         layout = QVBoxLayout(self)
         
-        self.app_settings = load_paths(filename=settings.app_settings_path)
+        self.app_settings = {**APP_SETTINGS_DEFAULTS, **load_paths(filename=settings.app_settings_path)}
         for key, value in self.app_settings.items():
             if isinstance(value, bool):
-                checkbox = QCheckBox(f"{key}")
+                checkbox = QCheckBox(SETTING_LABELS.get(key, f"{key}"))
                 checkbox.setChecked(value)
                 checkbox.stateChanged.connect(self.update_setting(key))
                 layout.addWidget(checkbox)
@@ -366,75 +507,327 @@ class SettingsDialog(QDialog):
     
     
     
+def list_protocol_files(folder_path) -> set:
+    """Все файлы в дереве протоколов."""
+    return {
+        str(p)
+        for p in Path(folder_path).rglob('*')
+        if p.is_file()
+    } if folder_path else set()
+
+
+def catalog_files(folder_path) -> set:
+    """Файлы протоколов из каталога; папку, которую каталог еще не обходил, обходим один раз."""
+    if not folder_path:
+        return set()
+    if not protocol_catalog.is_indexed(folder_path) and os.path.isdir(folder_path):
+        protocol_catalog.rebuild(folder_path)
+    return protocol_catalog.files(folder_path)
+
+
+class JournalLoader(QObject):
+    """Читает журнал (или его снимок) и список готовых протоколов вне GUI-потока."""
+    loaded = pyqtSignal(str, object, object, object)  # путь, DataFrame, файлы протоколов, хэши строк
+    failed = pyqtSignal(str, str)             # путь, текст ошибки
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+
+    def run(self):
+        try:
+            df = load_journal_frame(self.path)
+            files = catalog_files(settings.protocols_path)
+            fingerprints = row_fingerprints(df)
+        except Exception as e:
+            self.failed.emit(self.path, str(e))
+            return
+        self.loaded.emit(self.path, df, files, fingerprints)
+
+
+class JournalSync(QObject):
+    """Перечитывает измененный журнал вне GUI-потока и находит измененные и новые строки."""
+    synced = pyqtSignal(str, object)  # путь, JournalDiff
+    failed = pyqtSignal(str, str)     # путь, текст ошибки
+
+    def __init__(self, path, columns, fingerprints):
+        super().__init__()
+        self.path = path
+        self.columns = list(columns)
+        self.fingerprints = fingerprints
+
+    def run(self):
+        try:
+            diff = diff_journal(self.path, self.columns, self.fingerprints)
+        except Exception as e:
+            # Журнал может быть еще недописан (сохраняет Excel) - подождем следующего изменения
+            self.failed.emit(self.path, str(e))
+            return
+        self.synced.emit(self.path, diff)
+
+
+class SearchIndexBuilder(QObject):
+    """Строит индекс поиска по значениям столбцов вне GUI-потока."""
+    built = pyqtSignal(object, object)  # модель, SearchIndex
+
+    def __init__(self, model, columns):
+        super().__init__()
+        self.model = model
+        self.columns = columns
+
+    def run(self):
+        self.built.emit(self.model, SearchIndex(texts_from_values(self.columns)))
+
+
+class ProtocolsWatcher(QObject):
+    """Следит за папкой протоколов и всеми подпапками (YYYY-MM), сообщает о новых и удаленных файлах."""
+    files_changed = pyqtSignal(set, set)  # добавленные, удаленные
+
+    def __init__(self, folder_path, files: set):
+        super().__init__()
+        self.folder_path = folder_path
+        self.listing = {}  # папка -> файлы в ней (без вложенных папок)
+        for path in files:
+            self.listing.setdefault(os.path.dirname(path), set()).add(path)
+
+        self.watcher = QFileSystemWatcher()
+        self.watcher.directoryChanged.connect(self.on_directory_changed)
+        # Папки берем из списка файлов и верхнего уровня, без обхода всего дерева
+        self.listing.setdefault(folder_path, set())
+        with os.scandir(folder_path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    self.listing.setdefault(entry.path, set())
+        for directory in list(self.listing):
+            if os.path.isdir(directory):
+                self.watcher.addPath(directory)
+            else:
+                del self.listing[directory]
+
+        # Изменения копятся 300 мс: при создании протокола приходит сразу несколько событий
+        self.dirty = set()
+        self.debounce = QTimer()
+        self.debounce.setSingleShot(True)
+        self.debounce.setInterval(300)
+        self.debounce.timeout.connect(self.rescan)
+
+    def on_directory_changed(self, path):
+        self.dirty.add(path)
+        self.debounce.start()
+
+    def forget_directory(self, directory) -> set:
+        """Убирает папку и все вложенные из наблюдения, возвращает их файлы."""
+        removed = set()
+        prefix = os.path.join(directory, "")
+        for known in [d for d in self.listing if d == directory or d.startswith(prefix)]:
+            removed |= self.listing.pop(known)
+            self.watcher.removePath(known)
+        return removed
+
+    def rescan(self):
+        """Перечитывает только изменившиеся папки, а не все дерево."""
+        added, removed = set(), set()
+        dirty, self.dirty = self.dirty, set()
+        for directory in dirty:
+            if not os.path.isdir(directory):
+                removed |= self.forget_directory(directory)
+                continue
+            current_files = set()
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        current_files.add(entry.path)
+                    elif entry.is_dir() and entry.path not in self.listing:
+                        # Новая подпапка (например, новый месяц) - берем ее целиком под наблюдение
+                        for sub_dir, _, sub_files in os.walk(entry.path):
+                            self.listing[sub_dir] = {os.path.join(sub_dir, f) for f in sub_files}
+                            self.watcher.addPath(sub_dir)
+                            added |= self.listing[sub_dir]
+            # Удаленные подпапки
+            prefix = os.path.join(directory, "")
+            for known in [d for d in self.listing if d.startswith(prefix) and os.path.dirname(d) == directory]:
+                if not os.path.isdir(known):
+                    removed |= self.forget_directory(known)
+            previous = self.listing.get(directory, set())
+            added |= current_files - previous
+            removed |= previous - current_files
+            self.listing[directory] = current_files
+        if added or removed:
+            self.files_changed.emit(added, removed)
+
+
+# Цвета строк создаются один раз, а не на каждую строку
+QCOLORS = {name: QColor(name) for name in (GREEN, RED, DARKCYAN)}
+
+
 class PandasModel(QAbstractTableModel):
     """Модель, адаптирующая pandas.DataFrame под Qt TableView."""
     
-    def __init__(self, df):
+    def __init__(self, df, files=None, fingerprints=None):
         super().__init__()
         self._df = df
-        self.folder_path = settings.protocols_path  # берем путь к папке сразу из settings
-        self.files = {
-            str(p)
-            for p in Path(self.folder_path).rglob('*')
-            if p.is_file()
-        } if self.folder_path else set()
+        # Хэши строк в том виде, в каком их прочитали из журнала - для поиска измененных строк
+        self.fingerprints = fingerprints if fingerprints is not None else row_fingerprints(df)
+        # берем путь к папке сразу из settings; полный - как пути файлов в каталоге
+        self.folder_path = os.path.abspath(settings.protocols_path) if settings.protocols_path else None
+        self.files = set(files) if files is not None else catalog_files(self.folder_path)
         self.templates_path = settings.water_meter_templates_path
         self.templates = set(os.listdir(self.templates_path)) if self.templates_path else set()
-        self.row_colors = {}  # кэш цветов
+        self.color_engine = RowColorEngine(self.files, self.templates)
+        self.row_colors = []  # кэш цветов
+        # Индекс поиска строится в фоне; изменения строк до его готовности копятся
+        self.search_index = None
+        self.search_pending = set()
+        self.display = DisplayCache(df)  # кэш строк для отображения
         
-        # Таймер для автообновления списка файлов каждые 3 секунды
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_files)
-        self.timer.start(60000)
+        # Строки по заводскому номеру - чтобы перекрашивать только затронутые
+        self.serial_rows = {}
+        for row, serial in enumerate(self.serials(range(len(self._df)))):
+            self.add_serial(row, serial)
+
+        # Следим за папкой протоколов по событиям файловой системы, без периодического обхода
+        self.watcher = None
+        if self.folder_path and os.path.isdir(self.folder_path):
+            self.watcher = ProtocolsWatcher(self.folder_path, self.files)
+            self.watcher.files_changed.connect(self.update_files)
         self.update_row_colors()
         
+    def serials(self, rows) -> list:
+        """Заводские номера строк (столбец 7) как ключи индекса; None - номера нет."""
+        if len(self._df.columns) <= 7:
+            return [None] * len(rows)
+        return [
+            None if pd.isna(serial) else str(serial).strip()
+            for serial in self._df.iloc[list(rows), 7]
+        ]
+
+    def add_serial(self, row: int, serial):
+        if serial is None:
+            return
+        self.serial_rows.setdefault(serial, []).append(row)
+
+    def remove_serial(self, row: int, serial):
+        rows = self.serial_rows.get(serial)
+        if not rows or row not in rows:
+            return
+        rows.remove(row)
+        if not rows:
+            del self.serial_rows[serial]
+
+    def set_search_index(self, index):
+        self.search_index = index
+        pending, self.search_pending = sorted(self.search_pending), set()
+        self.refresh_search(pending)
+
+    def refresh_search(self, rows):
+        """Строки с новыми значениями - в индекс поиска (или в очередь, пока его нет)."""
+        rows = [row for row in rows if row < len(self._df)]
+        if not rows:
+            return
+        if self.search_index is None:
+            self.search_pending.update(rows)
+        else:
+            self.search_index.update(rows, row_texts(self._df, rows))
+
+    def apply_diff(self, diff):
+        """
+        Переносит в таблицу перечитанный журнал: меняются только измененные и новые строки,
+        их отображение, цвета и индекс заводских номеров.
+        """
+        if diff.reset:
+            self.beginResetModel()
+            self._df = diff.df
+            self.fingerprints = diff.fingerprints
+            self.display = DisplayCache(diff.df)
+            self.serial_rows = {}
+            for row, serial in enumerate(self.serials(range(len(diff.df)))):
+                self.add_serial(row, serial)
+            self.update_row_colors()
+            # Индекс строится заново - этим займется окно
+            self.search_index = None
+            self.search_pending = set()
+            self.endResetModel()
+            return
+
+        old_len = len(self._df)
+        new_len = old_len + diff.appended
+        rows = diff.changed + list(range(old_len, new_len))
+        for row, serial in zip(diff.changed, self.serials(diff.changed)):
+            self.remove_serial(row, serial)
+
+        if diff.appended:
+            self.beginInsertRows(QModelIndex(), old_len, new_len - 1)
+        self._df = diff.df
+        self.fingerprints = diff.fingerprints
+        self.display.invalidate_rows(rows, df=diff.df)
+        self.row_colors.extend([None] * diff.appended)
+        for row, serial in zip(rows, self.serials(rows)):
+            self.add_serial(row, serial)
+        if rows:
+            for row, name in zip(rows, self.color_engine.compute(diff.df.iloc[rows])):
+                self.row_colors[row] = QCOLORS[name] if name else None
+        if diff.appended:
+            self.endInsertRows()
+        self.refresh_search(rows)
+
+        last_column = self.columnCount() - 1
+        roles = [Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.BackgroundRole]
+        for first, last in row_runs(diff.changed):
+            self.dataChanged.emit(self.index(first, 0), self.index(last, last_column), roles)
+
     def update_row_colors(self):
         """Вычисляем цвет каждой строки заранее."""
-        self.row_colors.clear()
-        for row in range(len(self._df)):
-            col2_value = str(self._df.iat[row, 2])
-            col5_value = str(self._df.iat[row, 5])
-            col7_value = str(self._df.iat[row, 7])
-            
-            try:
-                register_year_2d = int(str(self._df.iat[row, 2]).split('-')[-1])
-                if self._df.iat[row, 44]:
-                    year = int(self._df.iat[row, 44])
-                else: year = 10000
-            
-            
-                current_year = datetime.now().year
-                current_2d = current_year % 100
-
-                if register_year_2d <= current_2d:
-                    register_year = 2000 + int(register_year_2d)
-                else:
-                    register_year = 1900 + int(register_year_2d)
-                
-            except Exception as e: 
-                year = 10000
-                register_year = 0
-            
-            
-            template_exists = any(col2_value in fname and col5_value in fname for fname in self.templates)
-            if any(col7_value in fname for fname in self.files):
-                self.row_colors[row] = QColor("green")
-            elif not template_exists:
-                self.row_colors[row] = QColor("red")
-            elif year < register_year:
-                self.row_colors[row] = QColor("darkcyan")
-            else:
-                self.row_colors[row] = None  # без цвета
+        self.row_colors = [
+            QCOLORS[name] if name else None
+            for name in self.color_engine.compute(self._df)
+        ]
 
         
-    def update_files(self):
-        """Обновляем список файлов и перерисовываем таблицу при изменении."""
-        if not self.folder_path:
+    def update_files(self, added: set, removed: set):
+        """Обновляем индекс файлов и перекрашиваем только строки с затронутыми номерами."""
+        self.files |= added
+        self.files -= removed
+        # Файлы, положенные или удаленные не через приложение, - и в каталог
+        protocol_catalog.remove_files(removed)
+        protocol_catalog.add_files(added)
+        self.color_engine.add_files(added)
+        self.color_engine.remove_files(removed)
+
+        rows = set()
+        for path in added | removed:
+            # Затронуты строки, чей номер встречается в имени файла
+            for serial in name_substrings(os.path.basename(path)):
+                rows.update(self.serial_rows.get(serial, ()))
+        if not rows:
             return
-        new_files = set(os.listdir(self.folder_path))
-        if new_files != self.files:
-            self.files = new_files
-            self.layoutChanged.emit()  # сообщает таблице, что данные изменились (цвета нужно обновить)
+
+        rows = sorted(rows)
+        colors = self.color_engine.compute(self._df.iloc[rows])
+        last_column = self.columnCount() - 1
+        for row, name in zip(rows, colors):
+            color = QCOLORS[name] if name else None
+            if self.row_colors[row] is not color:
+                self.row_colors[row] = color
+                self.dataChanged.emit(self.index(row, 0), self.index(row, last_column), [Qt.ItemDataRole.BackgroundRole])
+
+    def set_values(self, row: int, changes: dict):
+        """Записывает значения в строку таблицы (ключи - индексы столбцов) и обновляет только их."""
+        if not 0 <= row < len(self._df.index):
+            return
+        for col, value in changes.items():
+            if col >= len(self._df.columns):
+                continue
+            try:
+                self._df.iat[row, col] = value
+            except (TypeError, ValueError):
+                # Текст в числовой столбец - столбец становится объектным
+                self._df[self._df.columns[col]] = self._df.iloc[:, col].astype(object)
+                self._df.iat[row, col] = value
+            self.display.invalidate(row, col)
+            index = self.index(row, col)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DisplayRole])
+        if any(col in SEARCH_COLUMNS for col in changes):
+            self.refresh_search([row])
 
     def rowCount(self, parent=None):
         return len(self._df.index)
@@ -447,10 +840,10 @@ class PandasModel(QAbstractTableModel):
             return QVariant()
 
         if role == Qt.ItemDataRole.DisplayRole:
-            return str(self._df.iat[index.row(), index.column()])
+            return self.display.text(index.row(), index.column())
 
         if role == Qt.ItemDataRole.BackgroundRole:
-            return self.row_colors.get(index.row(), QVariant())
+            return self.row_colors[index.row()] or QVariant()
 
         return QVariant()
 
@@ -507,6 +900,11 @@ class MainWindow(QMainWindow):
         self.to_row_input.setFixedSize(200, 40)
         create_protocol_layout.addWidget(self.to_row_input)
 
+        self.dry_run_button = QPushButton("Проверить строки")
+        self.dry_run_button.setFixedSize(200, 40)
+        self.dry_run_button.clicked.connect(self.dry_run_rows)
+        create_protocol_layout.addWidget(self.dry_run_button)
+
         self.create_protocol_button = QPushButton("Создать протоколы")
         self.create_protocol_button.setFixedSize(200, 40)
         self.create_protocol_button.clicked.connect(self.create_protocols)
@@ -522,7 +920,30 @@ class MainWindow(QMainWindow):
         ### Layout с таблицей
         self.table_layout = QVBoxLayout()
         
+        # Поиск по заводскому номеру, рег. номеру, адресу и номеру протокола
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Поиск: заводской номер, рег. номер, адрес, номер протокола")
+        self.search_input.setEnabled(False)
+        self.search_input.textChanged.connect(self.search_rows)
+        self.table_layout.addWidget(self.search_input)
+        self.search_results = QListWidget()
+        self.search_results.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.search_results.setMaximumHeight(160)
+        self.search_results.hide()
+        self.search_results.itemSelectionChanged.connect(self.on_search_selected)
+        self.table_layout.addWidget(self.search_results)
+        self.search_builders = set()
+
         self.table = QTableView()
+        self.loaders = set()
+        # Журнал меняют прогоны и Excel - перечитываем только измененные строки
+        self.journal_watcher = QFileSystemWatcher(self)
+        self.journal_watcher.fileChanged.connect(self.on_journal_file_changed)
+        self.sync_timer = QTimer(self)
+        self.sync_timer.setSingleShot(True)
+        self.sync_timer.setInterval(JOURNAL_SYNC_DELAY_MS)
+        self.sync_timer.timeout.connect(self.sync_journal)
+        self.syncing = None  # (поток, JournalSync), пока идет сверка
         if data.get("journal_path", ""):
             self.load_excel_to_table(data["journal_path"])
         self.table_layout.addWidget(self.table)
@@ -531,11 +952,43 @@ class MainWindow(QMainWindow):
 
     ##################### Методы работы с таблицей
     def load_excel_to_table(self, path):
+        """Загружает журнал в фоне; пока идет загрузка, в таблице заглушка."""
+        # Результаты поиска относятся к прежней таблице
+        self.search_input.setEnabled(False)
+        self.search_results.clear()
+        self.search_results.hide()
+        placeholder = QStandardItemModel(1, 1)
+        placeholder.setItem(0, 0, QStandardItem("Загрузка журнала..."))
+        self.table.setModel(placeholder)
+        self.placeholder = placeholder
+
+        loader_thread = QThread()
+        loader = JournalLoader(path)
+        loader.moveToThread(loader_thread)
+        loader_thread.started.connect(loader.run)
+        loader.loaded.connect(self.on_journal_loaded)
+        loader.failed.connect(self.on_journal_failed)
+        loader.loaded.connect(loader_thread.quit)
+        loader.failed.connect(loader_thread.quit)
+        loader_thread.finished.connect(loader.deleteLater)
+        loader_thread.finished.connect(lambda: self.loaders.discard((loader_thread, loader)))
+        # Ссылки держим до конца загрузки, даже если уже выбран другой журнал
+        self.loaders.add((loader_thread, loader))
+        self.loading_path = path
+        loader_thread.start()
+
+    def on_journal_failed(self, path, error):
+        if path == self.loading_path:
+            print("Ошибка загрузки Excel:", error)
+
+    def on_journal_loaded(self, path, df, files, fingerprints):
+        # Пока журнал грузился, могли выбрать другой - старый результат не нужен
+        if path != self.loading_path:
+            return
+        self.watch_journal(path)
         try:
-            df = pd.read_excel(path)
-
             # создаём модель
-            self.model = PandasModel(df)
+            self.model = PandasModel(df, files=files, fingerprints=fingerprints)
             self.table.setModel(self.model)
             self.table.selectionModel().selectionChanged.connect(self.on_selection_changed)
             
@@ -558,9 +1011,121 @@ class MainWindow(QMainWindow):
             header = self.table.horizontalHeader()
             header.sectionResized.connect(self.save_column_width)
 
+            self.build_search_index()
+
         except Exception as e:
             print("Ошибка загрузки Excel:", e)
             
+    def watch_journal(self, path):
+        """Следим только за открытым журналом."""
+        watched = self.journal_watcher.files()
+        if watched:
+            self.journal_watcher.removePaths(watched)
+        if os.path.exists(path):
+            self.journal_watcher.addPath(path)
+
+    def on_journal_file_changed(self, path):
+        if path != self.loading_path:
+            return
+        # Excel и openpyxl сохраняют через замену файла - наблюдатель его теряет
+        if path not in self.journal_watcher.files() and os.path.exists(path):
+            self.journal_watcher.addPath(path)
+        # Сохранение - это несколько событий подряд; сверяем один раз, когда они утихнут
+        self.sync_timer.start()
+
+    def sync_journal(self):
+        if not hasattr(self, "model") or not os.path.exists(self.loading_path):
+            return
+        if self.syncing:
+            self.sync_timer.start()  # сверка еще идет - повторим после нее
+            return
+        sync_thread = QThread()
+        sync = JournalSync(self.loading_path, self.model._df.columns, self.model.fingerprints)
+        sync.moveToThread(sync_thread)
+        sync_thread.started.connect(sync.run)
+        sync.synced.connect(self.on_journal_synced)
+        sync.synced.connect(sync_thread.quit)
+        sync.failed.connect(sync_thread.quit)
+        sync_thread.finished.connect(sync.deleteLater)
+        sync_thread.finished.connect(self.on_sync_finished)
+        self.syncing = (sync_thread, sync)
+        sync_thread.start()
+
+    def on_sync_finished(self):
+        sync_thread, _ = self.syncing
+        self.syncing = None
+        sync_thread.deleteLater()
+
+    def on_journal_synced(self, path, diff):
+        # Пока журнал сверялся, могли открыть другой или загрузить этот заново
+        if path != self.loading_path or not hasattr(self, "model") or diff.base is not self.model.fingerprints:
+            return
+        if diff.empty:
+            return
+        self.model.apply_diff(diff)
+        if diff.reset:
+            self.build_search_index()
+
+    def build_search_index(self):
+        """Индекс поиска по текущей модели - в фоне; до готовности поиск недоступен."""
+        self.search_input.setEnabled(False)
+        self.search_input.setPlaceholderText("Поиск: индекс строится...")
+        builder_thread = QThread()
+        builder = SearchIndexBuilder(self.model, column_values(self.model._df))
+        builder.moveToThread(builder_thread)
+        builder_thread.started.connect(builder.run)
+        builder.built.connect(self.on_search_index_built)
+        builder.built.connect(builder_thread.quit)
+        builder_thread.finished.connect(builder.deleteLater)
+        builder_thread.finished.connect(lambda: self.search_builders.discard((builder_thread, builder)))
+        self.search_builders.add((builder_thread, builder))
+        builder_thread.start()
+
+    def on_search_index_built(self, model, index):
+        # Пока индекс строился, журнал могли открыть заново
+        if getattr(self, "model", None) is not model or model.search_index is not None:
+            return
+        model.set_search_index(index)
+        self.search_input.setPlaceholderText("Поиск: заводской номер, рег. номер, адрес, номер протокола")
+        self.search_input.setEnabled(True)
+        self.search_rows(self.search_input.text())
+
+    def search_rows(self, text):
+        """Результаты поиска - по строке на найденную строку журнала."""
+        self.search_results.clear()
+        index = getattr(self, "model", None) and self.model.search_index
+        rows = index.search(text) if index else []
+        if not rows:
+            self.search_results.setVisible(bool(text.strip()) and bool(index))
+            if text.strip() and index:
+                self.search_results.addItem("Ничего не найдено")
+            return
+        columns = [col for col in SEARCH_COLUMNS if col < self.model.columnCount()]
+        for row in rows:
+            values = " | ".join(value for value in (self.model.display.text(row, col) for col in columns) if value)
+            item = QListWidgetItem(f"Строка {row + 2}: {values}")
+            item.setData(Qt.ItemDataRole.UserRole, row)
+            self.search_results.addItem(item)
+        self.search_results.show()
+
+    def on_search_selected(self):
+        """Выбранные результаты выделяются в таблице, их строки - в поля диапазона."""
+        rows = [
+            item.data(Qt.ItemDataRole.UserRole)
+            for item in self.search_results.selectedItems()
+            if item.data(Qt.ItemDataRole.UserRole) is not None
+        ]
+        if not rows or not hasattr(self, "model"):
+            return
+        selection = QItemSelection()
+        last_column = self.model.columnCount() - 1
+        for row in rows:
+            selection.select(self.model.index(row, 0), self.model.index(row, last_column))
+        self.table.selectionModel().select(selection, QItemSelectionModel.SelectionFlag.ClearAndSelect)
+        self.table.scrollTo(self.model.index(min(rows), 0), QAbstractItemView.ScrollHint.PositionAtCenter)
+        self.from_row_input.setText(str(min(rows) + 2))
+        self.to_row_input.setText(str(max(rows) + 2))
+
     def save_column_width(self, index, old_size, new_size):
         # Создаём словарь если нет
         settings_data = load_paths(filename=settings.app_settings_path)
@@ -573,6 +1138,11 @@ class MainWindow(QMainWindow):
 
         save_paths(settings_data, filename=settings.app_settings_path)
         
+    def update_table_row(self, journal_row, changes):
+        """Переносит записанные в журнал значения в таблицу (строка 2 журнала - первая в таблице)."""
+        if hasattr(self, "model"):
+            self.model.set_values(journal_row - 2, changes)
+        
     def get_selected_rows(self):
         indexes = self.table.selectionModel().selectedIndexes()
         rows = sorted(set(index.row() for index in indexes))
@@ -586,6 +1156,30 @@ class MainWindow(QMainWindow):
 
 
     #### Создание протоколов
+
+    def dry_run_rows(self):
+        """Проверяет выбранные строки без создания протоколов и показывает отчет."""
+        journal_path = self.journal_path_label.text()
+        from_row = self.from_row_input.text()
+        to_row = self.to_row_input.text()
+        if not journal_path or not from_row or not to_row:
+            QMessageBox.warning(self, "Осторожно", "Укажите журнал и диапазон строк!")
+            return
+        try:
+            reader = JournalReader(journal_path)
+            records = list(reader.iter_records(int(from_row), int(to_row)))
+            report = dry_run(records, field_titles(reader.header()), ProtocolWorker.required_fields)
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось проверить строки: {e}")
+            return
+
+        box = QMessageBox(self)
+        box.setWindowTitle("Проверка строк")
+        box.setIcon(QMessageBox.Icon.Information if report.ok else QMessageBox.Icon.Warning)
+        box.setText(report.text().split("\n", 1)[0])
+        if report.errors or report.warnings:
+            box.setDetailedText(report.text())
+        box.exec()
         
     def create_protocols(self):
         journal_path = self.journal_path_label.text()
@@ -593,6 +1187,20 @@ class MainWindow(QMainWindow):
         from_row = self.from_row_input.text()
         to_row = self.to_row_input.text()
         
+        # Прошлый прогон по этому журналу прервался - предлагаем продолжить его
+        resume = False
+        state = RunCheckpoint(journal_path).load() if journal_path else None
+        if state:
+            answer = QMessageBox.question(
+                self, "Незавершенный прогон",
+                f"Прогон строк {state['from_row']}-{state['to_row']} от {state['started']} не был завершен "
+                f"(готово строк: {len(state['done'])}).\nПродолжить его?"
+            )
+            if answer == QMessageBox.StandardButton.Yes:
+                resume = True
+                from_row, to_row = str(state["from_row"]), str(state["to_row"])
+                protocols_path = state["protocols_path"]
+
         if not journal_path or not protocols_path or not from_row or not to_row:
             QMessageBox.warning(self, "Осторожно", "Заполните все поля!")
             return
@@ -601,7 +1209,9 @@ class MainWindow(QMainWindow):
             journal_path=journal_path,
             protocols_path=protocols_path,
             from_row=int(from_row),
-            to_row=int(to_row)
+            to_row=int(to_row),
+            on_row_updated=self.update_table_row,
+            resume=resume
         )
         dialog.exec()
         
@@ -630,7 +1240,9 @@ class MainWindow(QMainWindow):
         
         
 
-app = QApplication(sys.argv)    
-window = MainWindow()
-window.showMaximized()
-app.exec()
+# Защита нужна для пула процессов: дочерние процессы импортируют этот модуль заново
+if __name__ == "__main__":
+    app = QApplication(sys.argv)    
+    window = MainWindow()
+    window.showMaximized()
+    app.exec()
@@ -0,0 +1,241 @@
+"""
+Замер всего конвейера на синтетических журналах.
+
+    python -m benchmarks.run --rows 1000 10000 --render 20
+    python -m benchmarks.run --rows 1000 --compare benchmarks/results/прошлый.json
+
+Погода, настройки, снимки и готовые протоколы пишутся во временную папку,
+рабочие данные приложения не затрагиваются. Результат - JSON в benchmarks/results.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from EI_protocols_utils.utils.settings import settings
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+REGRESSION_RATIO = 1.2  # во сколько раз стадия может замедлиться без предупреждения
+
+
+class StageTimer:
+    """Время стадий: {стадия: {"seconds", "count", "ms_per_item"}}."""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def __call__(self, name: str, count: int):
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        self.stages[name] = {
+            "seconds": round(seconds, 4),
+            "count": count,
+            "ms_per_item": round(seconds * 1000 / count, 4) if count else None,
+        }
+        print(f"  {name:<20} {seconds:9.3f} с  ({count})")
+
+
+def isolate_settings(workdir: Path, backend: str):
+    """
+    Служебные файлы приложения - во временную папку. Вызывается до импорта
+    модулей core и app: их синглтоны читают пути из настроек при импорте.
+    """
+    settings.weather_journal_path = str(workdir / "weather_journal.json")
+    settings.app_settings_path = str(workdir / "app_settings.json")
+    settings.user_info_path = str(workdir / "user_info.json")
+    settings.protocol_times_path = str(workdir / "protocol_times.json")
+    settings.protocol_catalog_path = str(workdir / "protocol_catalog.sqlite3")
+    settings.protocols_path = str(workdir / "protocols")
+    settings.render_backend = backend
+    os.makedirs(settings.protocols_path, exist_ok=True)
+
+
+def bench_journal(path: Path, rows: int, args, workdir: Path) -> dict:
+    from main import Journal
+    from core.journal_reader import JournalReader
+    from core.measurements import compute_measurements, flow_range_text
+    from core.render import render_protocols
+    from core.snapshot import load_journal_frame, snapshot_dir
+    from core.templates import template_registry
+    from core.weather import weather_store
+    from core.writeback import JournalWriter
+
+    timer = StageTimer()
+    first_row, last_row = 2, rows + 1
+
+    # Погода для каждого журнала генерируется заново - прогоны сравнимы между собой
+    Path(settings.weather_journal_path).unlink(missing_ok=True)
+
+    with timer("journal_open", rows):
+        reader = JournalReader(path)
+        reader.header()
+        records = list(reader.iter_records(first_row, last_row))
+
+    with timer("weather_fill", rows):
+        weather_store.fill_records(records)
+        weather_store.flush()
+
+    journal = Journal(path)
+    with timer("validate_row", rows):
+        for record in records:
+            journal.validate_row(record)
+
+    # Рег. номер и наименование -> шаблон; поиск и разбор шаблонов не входят в замер расхода
+    templates = {}
+    for record in records:
+        key = (record.register_number, record.name)
+        if key not in templates:
+            templates[key] = template_registry.find(*key)
+            template_registry.cells(templates[key])
+    flow_count = min(rows, args.flow_rows)
+    with timer("flow_range", flow_count):
+        for record in records[:flow_count]:
+            cells = template_registry.cells(templates[(record.register_number, record.name)])
+            record.flow_range = flow_range_text(compute_measurements(cells)["max_flow"])
+
+    render_count = min(rows, args.render)
+    if render_count:
+        protocols_dir = Path(settings.protocols_path) / f"{rows}"
+        protocols_dir.mkdir(parents=True, exist_ok=True)
+        jobs = [
+            (record.row_number, journal.prepare_row(record, str(protocols_dir)))
+            for record in records[:render_count]
+        ]
+        failed = 0
+        with timer("render", render_count):
+            for _, _, error in render_protocols(jobs, args.workers):
+                failed += error is not None
+        if failed:
+            print(f"  render: ошибок {failed} из {render_count}")
+
+    # Сохранение - в копию журнала: синтетический журнал остается одинаковым между прогонами
+    writeback_count = min(rows, args.writeback_rows)
+    journal_copy = workdir / f"writeback_{path.name}"
+    shutil.copyfile(path, journal_copy)
+    writer = JournalWriter(journal_copy, flush_rows=writeback_count + 1, flush_seconds=float("inf"))
+    with timer("writeback_log", writeback_count):
+        for record in records[:writeback_count]:
+            writer.update_row(record.row_number, record.changes())
+    with timer("writeback_save", writeback_count):
+        writer.close()
+    journal_copy.unlink()
+
+    shutil.rmtree(snapshot_dir(), ignore_errors=True)
+    with timer("table_load_cold", rows):
+        df = load_journal_frame(path)
+    with timer("table_load_snapshot", rows):
+        df = load_journal_frame(path)
+
+    from app import PandasModel, list_protocol_files
+    from PyQt6.QtCore import QCoreApplication, Qt
+
+    # Модели и наблюдателю папки Qt нужен экземпляр приложения; ссылка держит его до конца замера
+    _ = QCoreApplication.instance() or QCoreApplication(sys.argv[:1])
+    files = list_protocol_files(settings.protocols_path)
+    with timer("table_colouring", rows):
+        model = PandasModel(df, files)
+    visible_rows = min(rows, 50)
+    with timer("table_first_screen", visible_rows * model.columnCount()):
+        for row in range(visible_rows):
+            for col in range(model.columnCount()):
+                model.data(model.index(row, col), Qt.ItemDataRole.DisplayRole)
+                model.data(model.index(row, col), Qt.ItemDataRole.BackgroundRole)
+
+    return timer.stages
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result: dict, baseline_path) -> list:
+    """Стадии, которые стали медленнее базового прогона больше чем в REGRESSION_RATIO раз."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = []
+    print(f"\nСравнение с {baseline_path} ({baseline.get('commit')}):")
+    for rows, stages in result["journals"].items():
+        old_stages = baseline.get("journals", {}).get(rows)
+        if not old_stages:
+            continue
+        for name, stage in stages.items():
+            old = old_stages.get(name)
+            if not old or not old["ms_per_item"] or not stage["ms_per_item"]:
+                continue
+            ratio = stage["ms_per_item"] / old["ms_per_item"]
+            mark = "  <-- медленнее" if ratio > REGRESSION_RATIO else ""
+            print(f"  {rows:>7} {name:<20} x{ratio:5.2f}{mark}")
+            if mark:
+                regressions.append((rows, name, ratio))
+    return regressions
+
+
+def main(argv=None) -> int:
+    from benchmarks.synthetic import make_journal
+
+    parser = argparse.ArgumentParser(description="Замер стадий создания протоколов на синтетических журналах")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000], help="размеры журналов")
+    parser.add_argument("--render", type=int, default=10, help="сколько протоколов создать в каждом журнале")
+    parser.add_argument("--flow-rows", type=int, default=1000, help="строк для замера расчета расхода")
+    parser.add_argument("--writeback-rows", type=int, default=200, help="строк для замера сохранения журнала")
+    parser.add_argument("--workers", type=int, default=1, help="процессов для создания протоколов")
+    parser.add_argument("--backend", default="headless", help="render_backend: headless или excel")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="папка для журналов и служебных файлов (по умолчанию временная)")
+    parser.add_argument("--output", help="файл результата (по умолчанию benchmarks/results/<дата>.json)")
+    parser.add_argument("--compare", help="прошлый результат для сравнения")
+    args = parser.parse_args(argv)
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="ei_bench_"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    isolate_settings(workdir, args.backend)
+
+    result = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "backend": args.backend,
+        "workers": args.workers,
+        "seed": args.seed,
+        "journals": {},
+    }
+    for rows in args.rows:
+        path = workdir / f"journal_{rows}_{args.seed}.xlsx"
+        if not path.exists():
+            print(f"Создаем журнал на {rows} строк...")
+            make_journal(path, rows, settings.water_meter_templates_path, seed=args.seed)
+        print(f"Журнал {rows} строк:")
+        result["journals"][str(rows)] = bench_journal(path, rows, args, workdir)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=4)
+    print(f"\nРезультат: {output}")
+
+    if not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if args.compare and compare(result, args.compare):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
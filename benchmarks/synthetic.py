@@ -0,0 +1,98 @@
+import os
+import random
+import re
+from datetime import datetime, timedelta
+
+from openpyxl import Workbook
+
+from EI_protocols_utils.utils.constants import JOURNAL_WORKSHEET
+
+JOURNAL_WIDTH = 50
+# Подписи столбцов, которые читает приложение; остальные - "Столбец N"
+HEADER = {
+    0: "Номер протокола",
+    1: "Количество",
+    2: "Рег. номер",
+    5: "Наименование СИ",
+    7: "Заводской номер",
+    9: "Дата поверки",
+    10: "Дата следующей поверки",
+    12: "Эталоны",
+    13: "Результат",
+    14: "Температура",
+    15: "Давление",
+    16: "Влажность",
+    21: "Методика",
+    32: "Адрес",
+    34: "Количество листов",
+    35: "Поверитель",
+    38: "Причины непригодности",
+    41: "Диапазон расхода",
+    44: "Год выпуска",
+    45: "Показания",
+    47: "Владелец",
+    48: "Тип",
+}
+STREETS = ("Ленина", "Московская", "Комсомольская", "Большева", "Красноармейская", "Гагарина")
+# "ЕИ-03-02-01180 Счетчик воды УВС-15Х №120252935 (47204-11).xlsm"
+_TEMPLATE_RE = re.compile(r"Счетчик воды (.+?) №.*\(([^()]+)\)\s*\.\w+$")
+
+
+def template_types(templates_path) -> list:
+    """Пары (наименование, рег. номер) из имен шаблонов - строки журнала будут с существующими шаблонами."""
+    types = []
+    for fname in sorted(os.listdir(templates_path)):
+        match = _TEMPLATE_RE.search(fname)
+        if match:
+            types.append((match.group(1), match.group(2)))
+    if not types:
+        raise FileNotFoundError(f"В папке {templates_path} нет шаблонов счетчиков воды")
+    return types
+
+
+def make_row(row_number: int, types: list, rng: random.Random, weather_gaps: float) -> list:
+    name, register_number = rng.choice(types)
+    register_year = int(register_number.split("-")[-1])
+    register_year += 2000 if register_year <= datetime.now().year % 100 else 1900
+    day = datetime(2025, 1, 1) + timedelta(days=rng.randrange(365))
+
+    row = [None] * JOURNAL_WIDTH
+    row[0] = f"ЕИ-03-02-{row_number:05d}"
+    row[2] = register_number
+    row[5] = name
+    row[7] = str(rng.randrange(10 ** 7, 10 ** 9))
+    row[9] = day
+    row[10] = day.replace(year=day.year + 6)
+    row[12] = "УПСЖ 5П №2350"
+    suitable = rng.random() > 0.05
+    row[13] = "Пригодно" if suitable else "Непригодно"
+    row[21] = "МИ 1592-2015"
+    if rng.random() >= weather_gaps:
+        row[14] = f"{rng.uniform(20, 25):.1f} °C"
+        row[15] = f"{rng.uniform(98.5, 102):.1f} кП"
+        row[16] = f"{rng.uniform(42, 58):.1f} %"
+    row[32] = f"г. Киров, ул. {rng.choice(STREETS)}, {rng.randrange(1, 120)}-{rng.randrange(1, 200)}"
+    row[35] = "Стариков Сергей Владимирович"
+    row[38] = None if suitable else "Течь"
+    row[44] = rng.randrange(register_year, 2026)
+    row[45] = f"{rng.uniform(0, 2000):.3f}".replace(".", ",")
+    row[48] = rng.choice(("ХВС", "ГВС"))
+    return row
+
+
+def make_journal(path, rows: int, templates_path, seed: int = 0, weather_gaps: float = 0.3) -> str:
+    """
+    Синтетический журнал из rows строк: рег. номера и наименования - из шаблонов,
+    даты - за 2025 год, у доли weather_gaps строк не заполнена погода.
+    С одним seed журнал получается одинаковым.
+    """
+    rng = random.Random(seed)
+    types = template_types(templates_path)
+
+    workbook = Workbook(write_only=True)
+    wsheet = workbook.create_sheet(JOURNAL_WORKSHEET)
+    wsheet.append([HEADER.get(col, f"Столбец {col}") for col in range(JOURNAL_WIDTH)])
+    for row_number in range(1, rows + 1):
+        wsheet.append(make_row(row_number, types, rng, weather_gaps))
+    workbook.save(path)
+    return str(path)
@@ -0,0 +1,138 @@
+import random
+import re
+from datetime import datetime
+from pathlib import Path
+
+from EI_protocols_utils.utils.constants import WATER_METER_PROTOTOCOL_SEETNAME
+from EI_protocols_utils.utils.settings import settings
+from core.formulas import FormulaEvaluator
+from core.measurements import compute_measurements
+from core.pdf import sheet_to_pdf
+from core.templates import template_registry
+
+DATA_SHEETNAME = "Данные"
+DATA_ROWS = 20  # поля для заполнения - в первых строках листа "Данные"
+_UNSAFE_CHARS_RE = re.compile(r'[\\/:*?"<>|]')
+# Пометка в имени шаблона между номером и "Счетчик воды": "ЕИ-03-02-01320 ОПТ Счетчик воды ..."
+_TEMPLATE_MARK_RE = re.compile(r"^ЕИ-\S+\s+(?P<mark>.*?)\s*Счетчик воды")
+
+
+class ExcelBackend:
+    """Протокол через Excel (WaterMeterProtocol): нужен Windows и установленный Excel."""
+
+    name = "excel"
+
+    def render(self, protocol_kwargs: dict, measurements: dict = None) -> tuple:
+        from EI_protocols_utils.utils.models import WaterMeterProtocol
+
+        return WaterMeterProtocol(**protocol_kwargs).create()
+
+
+class HeadlessBackend:
+    """
+    Протокол без Excel: шаблон из кэша заполняется в памяти, формулы листа
+    протокола считаются своим вычислителем и записываются значениями,
+    xlsx сохраняется openpyxl, PDF печатается reportlab.
+    """
+
+    name = "headless"
+
+    def data_values(self, protocol_kwargs: dict, data_cells: dict) -> dict:
+        """
+        Ячейки листа "Данные", которые в шаблоне заполняются вручную.
+        Строки ищутся по подписям в столбце A: в части шаблонов есть лишняя строка
+        (коэффициент преобразования), и все поля ниже нее сдвинуты.
+        B1 (тип для поиска в таблице шаблона) не трогаем - шаблон и так выбран по типу.
+        """
+        water = settings.hot_water_temperatures if "Г" in str(protocol_kwargs.get("unit_type") or "").upper() \
+            else settings.cold_water_temperatures
+        water_temperature = random.randint(int(water["min"]), int(water["max"]))
+        fields = {
+            "протокол №": str(protocol_kwargs["protocol_number"]),
+            "год изготовления": protocol_kwargs["year"],
+            "номер": str(protocol_kwargs["number"]),
+            "показания на начало поверки": f"{protocol_kwargs['readings']:.3f}".replace(".", ","),
+            "собственник": protocol_kwargs["owner"],
+            "адрес": protocol_kwargs["address"],
+            "таб номер поверителя": protocol_kwargs["tab_number"],
+            "дата": datetime.strptime(protocol_kwargs["date"], "%d.%m.%Y"),
+            "температура воздуха": protocol_kwargs["temperature"],
+            "влажность воздуха": protocol_kwargs["humidity"],
+            "атмосферное давление": protocol_kwargs["pressure"],
+            "t пов-й жидкости в начале": water_temperature,
+            "t пов-й жидкости в конце": water_temperature,
+        }
+        values = {}
+        for row in range(1, DATA_ROWS + 1):
+            label = " ".join(str(data_cells.get(f"A{row}") or "").lower().split())
+            for prefix, value in fields.items():
+                if label == prefix or label.startswith(prefix + " ") or label.startswith(prefix + ","):
+                    values[f"B{row}"] = value
+                    break
+        missing = len(fields) - len(values)
+        if missing:
+            raise Exception(f"В шаблоне на листе \"{DATA_SHEETNAME}\" не найдено полей: {missing}")
+        return values
+
+    def file_stem(self, protocol_kwargs: dict, template=None) -> str:
+        """Имя файла протокола как у Excel-бэкенда, с пометкой шаблона ("ОПТ"), если она есть."""
+        match = _TEMPLATE_MARK_RE.match(Path(template).stem) if template else None
+        mark = f"{match['mark']} " if match and match["mark"] else ""
+        stem = (
+            f"ЕИ-03-{protocol_kwargs['tab_number']}-{protocol_kwargs['protocol_number']} "
+            f"{mark}Счетчик воды {protocol_kwargs['name']} №{protocol_kwargs['number']} "
+            f"({protocol_kwargs['register_number']})"
+        )
+        return _UNSAFE_CHARS_RE.sub("_", stem)
+
+    def render(self, protocol_kwargs: dict, measurements: dict = None) -> tuple:
+        template = template_registry.find(protocol_kwargs["register_number"], protocol_kwargs["name"])
+        cells = template_registry.cells(template)
+        if measurements is None:
+            measurements = compute_measurements(cells)
+
+        # Листы копируются поверхностно: кэш шаблона не меняется
+        evaluator = FormulaEvaluator({name: dict(sheet) for name, sheet in cells.items()})
+        data = self.data_values(protocol_kwargs, cells[DATA_SHEETNAME])
+        for coord, value in data.items():
+            evaluator.set_value(DATA_SHEETNAME, coord, value)
+        for coord, flow in measurements["flows"].items():
+            evaluator.set_value(WATER_METER_PROTOTOCOL_SEETNAME, coord, flow)
+
+        workbook = template_registry.workbook(template)
+        wsheet = workbook[WATER_METER_PROTOTOCOL_SEETNAME]
+        for coord, value in data.items():
+            workbook[DATA_SHEETNAME][coord] = value
+        for coord, raw in cells[WATER_METER_PROTOTOCOL_SEETNAME].items():
+            if coord in measurements["flows"] or (isinstance(raw, str) and raw.startswith("=")):
+                wsheet[coord] = evaluator.value(WATER_METER_PROTOTOCOL_SEETNAME, coord)
+
+        if not protocol_kwargs.get("suitability", True):
+            reasons = protocol_kwargs.get("reasons_for_unsuitability")
+            bad_msg = settings.water_meter_bad_msg + (f" {reasons}" if reasons else "")
+            for coord, raw in cells[WATER_METER_PROTOTOCOL_SEETNAME].items():
+                if raw == settings.water_meter_good_msg:
+                    wsheet[coord] = bad_msg
+
+        # Макросы не сохраняем: результат - обычная книга xlsx со значениями
+        workbook.vba_archive = None
+        stem = Path(protocol_kwargs["dir_path"], self.file_stem(protocol_kwargs, template))
+        xlsx_path, pdf_path = stem.with_name(stem.name + ".xlsx"), stem.with_name(stem.name + ".pdf")
+        workbook.save(xlsx_path)
+        sheet_to_pdf(wsheet, pdf_path)
+        return xlsx_path, pdf_path
+
+
+BACKENDS = {
+    ExcelBackend.name: ExcelBackend,
+    HeadlessBackend.name: HeadlessBackend,
+}
+
+
+def get_backend(name: str = None):
+    """Бэкенд из настроек (render_backend), по умолчанию - Excel."""
+    name = name or getattr(settings, "render_backend", ExcelBackend.name)
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Неизвестный render_backend: {name}. Доступны: {', '.join(BACKENDS)}") from None
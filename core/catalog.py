@@ -0,0 +1,277 @@
+"""
+Каталог готовых протоколов в SQLite: номер протокола, табельный номер, заводской номер,
+рег. номер, дата, файлы с размерами и хэш входных данных - поиск без обхода папок.
+
+    python -m core.catalog rebuild [--root папка]   # один раз по уже созданным протоколам
+    python -m core.catalog find 01180
+    python -m core.catalog duplicates
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from EI_protocols_utils.utils.settings import settings
+
+# "ЕИ-03-02-01180 Счетчик воды УВС-15Х №120252935 (47204-11)", перед "Счетчик воды" бывает пометка ("ОПТ")
+_STEM_RE = re.compile(r"^ЕИ-\d+-(?P<tab>[^-\s]+)-(?P<number>\S+)\s+(?:.*?\s)?Счетчик воды\s+(?P<name>.*?)\s*№(?P<serial>\S+)\s+\((?P<register>[^()]+)\)$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS protocols (
+    xlsx TEXT PRIMARY KEY,
+    pdf TEXT,
+    protocol_number TEXT,
+    tab_number TEXT,
+    serial TEXT,
+    register_number TEXT,
+    name TEXT,
+    date TEXT,
+    xlsx_size INTEGER,
+    pdf_size INTEGER,
+    input_hash TEXT,
+    journal TEXT,
+    row INTEGER,
+    created TEXT
+);
+CREATE INDEX IF NOT EXISTS protocols_serial ON protocols (serial);
+CREATE INDEX IF NOT EXISTS protocols_number ON protocols (protocol_number, tab_number);
+CREATE INDEX IF NOT EXISTS protocols_pdf ON protocols (pdf);
+CREATE INDEX IF NOT EXISTS protocols_input ON protocols (input_hash);
+CREATE TABLE IF NOT EXISTS indexed_roots (
+    root TEXT PRIMARY KEY,
+    indexed TEXT
+);
+"""
+COLUMNS = ("xlsx", "pdf", "protocol_number", "tab_number", "serial", "register_number", "name", "date",
+           "xlsx_size", "pdf_size", "input_hash", "journal", "row", "created")
+
+
+def iso_date(value) -> str:
+    """"05.10.2025" -> "2025-10-05", чтобы даты сортировались; неразборчивое - как есть."""
+    try:
+        return datetime.strptime(str(value), "%d.%m.%Y").date().isoformat()
+    except ValueError:
+        return str(value) if value else None
+
+
+def file_size(path) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def parse_name(path) -> dict:
+    """Поля протокола из имени файла; None, если имя не по форме."""
+    match = _STEM_RE.match(Path(path).stem)
+    if not match:
+        return None
+    return {
+        "protocol_number": match["number"],
+        "tab_number": match["tab"],
+        "serial": match["serial"],
+        "register_number": match["register"],
+        "name": match["name"],
+    }
+
+
+def _prefix_pattern(root) -> str:
+    """LIKE-шаблон для всех путей внутри папки root."""
+    prefix = os.path.join(os.path.abspath(root), "")
+    return prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+class ProtocolCatalog:
+    """
+    Индекс готовых протоколов. Запись добавляет тот, кто получил результат создания протокола
+    (в основном процессе, не в пуле), поэтому писатель у базы один. Пути хранятся полные.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.local = threading.local()  # соединение SQLite нельзя передавать между потоками
+
+    def connect(self) -> sqlite3.Connection:
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            self.local.connection = connection
+        return connection
+
+    def add(self, protocol_kwargs: dict, xlsx_path, pdf_path, input_hash: str = None, journal=None, row: int = None):
+        """Созданный протокол; запись с тем же xlsx заменяется."""
+        self._insert([{
+            "xlsx": os.path.abspath(xlsx_path),
+            "pdf": os.path.abspath(pdf_path),
+            "protocol_number": str(protocol_kwargs["protocol_number"]),
+            "tab_number": str(protocol_kwargs["tab_number"]),
+            "serial": str(protocol_kwargs["number"]).strip(),
+            "register_number": str(protocol_kwargs["register_number"]),
+            "name": str(protocol_kwargs["name"]),
+            "date": iso_date(protocol_kwargs.get("date")),
+            "xlsx_size": file_size(xlsx_path),
+            "pdf_size": file_size(pdf_path),
+            "input_hash": input_hash,
+            "journal": os.path.abspath(journal) if journal else None,
+            "row": row,
+            "created": datetime.now().isoformat(timespec="seconds"),
+        }], replace=True)
+
+    def add_files(self, paths) -> int:
+        """
+        Протоколы по именам файлов (появившиеся в папке не через приложение). Записи, добавленные
+        при создании протокола, не затираются - только дополняются недостающим pdf. Файл с именем
+        не по форме тоже попадает в каталог (с именем как есть), чтобы его видела подсветка строк.
+        Возвращает число файлов-пар.
+        """
+        pairs = {}
+        for path in paths:
+            path = Path(os.path.abspath(path))
+            if path.suffix.lower() in (".xlsx", ".pdf"):
+                pairs.setdefault(path.with_suffix(""), {})[path.suffix.lower()] = path
+        records = []
+        for stem, files in pairs.items():
+            fields = parse_name(stem.with_suffix(".xlsx")) or {"name": stem.name}
+            xlsx, pdf = files.get(".xlsx"), files.get(".pdf")
+            # Месяц создания - из папки вида 2025-10, если протокол лежит в ней
+            month = stem.parent.name if re.fullmatch(r"\d{4}-\d{2}", stem.parent.name) else None
+            records.append(dict(
+                fields,
+                xlsx=str(xlsx or stem.with_suffix(".xlsx")),
+                pdf=str(pdf) if pdf else None,
+                date=month,
+                xlsx_size=file_size(xlsx) if xlsx else None,
+                pdf_size=file_size(pdf) if pdf else None,
+                input_hash=None, journal=None, row=None,
+                created=datetime.now().isoformat(timespec="seconds"),
+            ))
+        self._insert(records, replace=False)
+        return len(records)
+
+    def _insert(self, records: list, replace: bool):
+        if not records:
+            return
+        query = f"INSERT INTO protocols ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))}) ON CONFLICT (xlsx) DO UPDATE SET "
+        if replace:
+            query += ", ".join(f"{column} = excluded.{column}" for column in COLUMNS[1:])
+        else:
+            query += "pdf = COALESCE(pdf, excluded.pdf), pdf_size = COALESCE(pdf_size, excluded.pdf_size)"
+        connection = self.connect()
+        with connection:
+            connection.executemany(query, [tuple(record.get(column) for column in COLUMNS) for record in records])
+
+    def remove_files(self, paths):
+        """Удаленные файлы: запись уходит, когда пропал xlsx, а pdf только очищается."""
+        paths = [os.path.abspath(path) for path in paths]
+        if not paths:
+            return
+        connection = self.connect()
+        with connection:
+            connection.executemany("DELETE FROM protocols WHERE xlsx = ?", [(path,) for path in paths])
+            connection.executemany("UPDATE protocols SET pdf = NULL, pdf_size = NULL WHERE pdf = ?", [(path,) for path in paths])
+
+    def files(self, root=None) -> set:
+        """Все файлы протоколов из каталога (под root, если задан), полные пути."""
+        query = "SELECT xlsx, pdf FROM protocols"
+        params = ()
+        if root:
+            query += " WHERE xlsx LIKE ? ESCAPE '\\'"
+            params = (_prefix_pattern(root),)
+        files = set()
+        for xlsx, pdf in self.connect().execute(query, params):
+            files.add(xlsx)
+            if pdf:
+                files.add(pdf)
+        return files
+
+    def find(self, protocol_number: str = None, tab_number: str = None, serial: str = None) -> list:
+        """Протоколы по номеру (с табельным или без) и/или заводскому номеру."""
+        conditions, params = [], []
+        for column, value in (("protocol_number", protocol_number), ("tab_number", tab_number), ("serial", serial)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(str(value).strip())
+        query = "SELECT * FROM protocols" + (" WHERE " + " AND ".join(conditions) if conditions else "")
+        return [dict(row) for row in self.connect().execute(query + " ORDER BY date, protocol_number", params)]
+
+    def duplicates(self) -> list:
+        """Номера протоколов, которые выданы больше одному файлу: [{tab_number, protocol_number, count, files}]."""
+        rows = self.connect().execute(
+            "SELECT tab_number, protocol_number, COUNT(*) AS count, GROUP_CONCAT(xlsx, '\n') AS files "
+            "FROM protocols WHERE protocol_number IS NOT NULL GROUP BY tab_number, protocol_number HAVING COUNT(*) > 1 "
+            "ORDER BY tab_number, protocol_number"
+        )
+        return [dict(row, files=row["files"].split("\n")) for row in rows]
+
+    def is_indexed(self, root) -> bool:
+        """Была ли папка root уже целиком обойдена rebuild()."""
+        row = self.connect().execute("SELECT 1 FROM indexed_roots WHERE root = ?", (os.path.abspath(root),))
+        return row.fetchone() is not None
+
+    def rebuild(self, root) -> int:
+        """Заново заполняет каталог по дереву папки протоколов и отмечает папку. Возвращает число протоколов."""
+        connection = self.connect()
+        paths = [os.path.join(directory, name) for directory, _, names in os.walk(root) for name in names]
+        with connection:
+            connection.execute("DELETE FROM protocols WHERE xlsx LIKE ? ESCAPE '\\'", (_prefix_pattern(root),))
+        count = self.add_files(paths)
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO indexed_roots (root, indexed) VALUES (?, ?)",
+                (os.path.abspath(root), datetime.now().isoformat(timespec="seconds")),
+            )
+        return count
+
+    def close(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+
+protocol_catalog = ProtocolCatalog(getattr(settings, "protocol_catalog_path", "data/protocol_catalog.sqlite3"))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Каталог готовых протоколов")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild = commands.add_parser("rebuild", help="заполнить каталог по папке протоколов")
+    rebuild.add_argument("--root", default=settings.protocols_path, help="папка протоколов")
+    find = commands.add_parser("find", help="где протокол: по номеру или заводскому номеру")
+    find.add_argument("number", nargs="?", help="номер протокола, например 01180")
+    find.add_argument("--tab", help="табельный номер")
+    find.add_argument("--serial", help="заводской номер")
+    commands.add_parser("duplicates", help="номера протоколов, выданные несколько раз")
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild":
+        count = protocol_catalog.rebuild(Path(args.root).resolve())
+        print(f"В каталоге протоколов: {count} ({protocol_catalog.path})")
+    elif args.command == "find":
+        rows = protocol_catalog.find(args.number, args.tab, args.serial)
+        for row in rows:
+            print(f"ЕИ-03-{row['tab_number']}-{row['protocol_number']}  №{row['serial']}  {row['date'] or ''}\n"
+                  f"  {row['xlsx']}\n  {row['pdf'] or '(pdf нет)'}")
+        if not rows:
+            print("Не найдено")
+            return 1
+    elif args.command == "duplicates":
+        rows = protocol_catalog.duplicates()
+        for row in rows:
+            print(f"ЕИ-03-{row['tab_number']}-{row['protocol_number']}: {row['count']} файла")
+            for path in row["files"]:
+                print(f"  {path}")
+        print(f"Повторов: {len(rows)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
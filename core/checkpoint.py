@@ -0,0 +1,73 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+
+class RunCheckpoint:
+    """
+    Манифест прогона рядом с журналом: диапазон строк, готовые строки с путями
+    к протоколам и записанными в журнал изменениями. Каждая запись дописывается
+    с fsync, поэтому после падения видно, какие строки уже сделаны.
+    Файл удаляется, когда прогон завершен.
+    """
+
+    def __init__(self, journal_path):
+        self.path = Path(f"{journal_path}.run.jsonl")
+
+    def _append(self, record: dict, mode: str = "a"):
+        with open(self.path, mode, encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def start(self, from_row: int, to_row: int, protocols_path):
+        """Новый прогон: прежний манифест перезаписывается."""
+        self._append({
+            "type": "run",
+            "from_row": from_row,
+            "to_row": to_row,
+            "protocols_path": str(protocols_path),
+            "started": datetime.now().isoformat(timespec="seconds"),
+        }, mode="w")
+
+    def mark_done(self, row_number: int, xlsx_path, pdf_path, changes: dict):
+        self._append({
+            "type": "done",
+            "row": row_number,
+            "xlsx": str(xlsx_path),
+            "pdf": str(pdf_path),
+            "changes": changes,
+        })
+
+    def load(self) -> dict:
+        """
+        Незавершенный прогон: {"from_row", "to_row", "protocols_path", "started", "done": {строка: (xlsx, pdf)}}
+        или None, если манифеста нет.
+        """
+        if not self.path.exists():
+            return None
+        state = None
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # недописанная последняя строка при падении
+                if record.get("type") == "run":
+                    state = {key: record[key] for key in ("from_row", "to_row", "protocols_path", "started")}
+                    state["done"] = {}
+                elif record.get("type") == "done" and state is not None:
+                    state["done"][record["row"]] = (Path(record["xlsx"]), Path(record["pdf"]))
+        return state
+
+    def completed_rows(self, state: dict) -> dict:
+        """Готовые строки, у которых оба файла протокола на месте; остальные создаются заново."""
+        return {
+            row_number: paths
+            for row_number, paths in state["done"].items()
+            if all(path.exists() for path in paths)
+        }
+
+    def finish(self):
+        self.path.unlink(missing_ok=True)
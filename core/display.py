@@ -0,0 +1,64 @@
+from datetime import date, datetime
+
+import pandas as pd
+
+BLOCK_SIZE = 512  # строк в одном блоке кэша
+
+
+def format_value(value) -> str:
+    """Текст ячейки для таблицы: даты как дд.мм.гггг, пустые значения - пустая строка."""
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return "" if pd.isna(value) else value.strftime("%d.%m.%Y")
+    if isinstance(value, float) and value != value:  # NaN
+        return ""
+    if value is pd.NaT or value is pd.NA:
+        return ""
+    return str(value)
+
+
+class DisplayCache:
+    """
+    Готовые строки для отображения, по блокам столбца.
+    Блок форматируется при первом обращении к любой его ячейке,
+    при записи в ячейку сбрасывается только она.
+    """
+
+    def __init__(self, df: pd.DataFrame, block_size: int = BLOCK_SIZE):
+        self.df = df
+        self.block_size = block_size
+        self.blocks = {}  # (столбец, номер блока) -> кортеж строк
+
+    def _render_block(self, col: int, block: int) -> tuple:
+        start = block * self.block_size
+        values = self.df.iloc[start:start + self.block_size, col]
+        if pd.api.types.is_datetime64_any_dtype(values.dtype):
+            return tuple(values.dt.strftime("%d.%m.%Y").fillna(""))
+        return tuple(format_value(value) for value in values)
+
+    def text(self, row: int, col: int) -> str:
+        key = (col, row // self.block_size)
+        block = self.blocks.get(key)
+        if block is None:
+            block = self.blocks[key] = self._render_block(col, key[1])
+        return block[row % self.block_size]
+
+    def invalidate(self, row: int, col: int):
+        """Сбрасывает одну ячейку: блок остается, в нем заменяется строка."""
+        key = (col, row // self.block_size)
+        block = self.blocks.get(key)
+        if block is not None:
+            offset = row % self.block_size
+            self.blocks[key] = block[:offset] + (format_value(self.df.iat[row, col]),) + block[offset + 1:]
+
+    def invalidate_rows(self, rows, df: pd.DataFrame = None):
+        """Сбрасывает блоки с этими строками во всех столбцах; df - новая таблица, если она заменена."""
+        if df is not None:
+            self.df = df
+        stale = {row // self.block_size for row in rows}
+        for key in [key for key in self.blocks if key[1] in stale]:
+            del self.blocks[key]
+
+    def clear(self):
+        self.blocks.clear()
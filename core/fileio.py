@@ -0,0 +1,27 @@
+import json
+import os
+from pathlib import Path
+
+
+def atomic_write(path, write, fsync: bool = False):
+    """
+    Записывает файл через временный рядом с ним и os.replace: читатель видит
+    либо старый файл, либо новый целиком. write(tmp_path) создает временный файл;
+    fsync - дождаться, пока он ляжет на диск, до подмены.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    write(tmp_path)
+    if fsync:
+        with open(tmp_path, "rb+") as f:
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def atomic_write_json(path, data, indent: int = 4, fsync: bool = False):
+    """Атомарно сохраняет data в JSON (кириллица как есть)."""
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+    atomic_write(path, write, fsync)
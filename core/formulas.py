@@ -0,0 +1,330 @@
+import datetime
+import random
+import re
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP, ROUND_UP
+from functools import lru_cache
+
+from openpyxl.utils.cell import column_index_from_string, coordinate_from_string, get_column_letter
+
+
+class FormulaError(Exception):
+    """Формулу шаблона не удалось разобрать или вычислить."""
+
+
+# Лексемы формул Excel в том объеме, который используется в шаблонах протоколов
+_TOKEN_RE = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<string>"(?:[^"]|"")*")
+  | (?P<ref>(?:(?:'[^']+'|[^\W\d][\w.]*)!)?\$?[A-Z]{1,3}\$?\d+(?::\$?[A-Z]{1,3}\$?\d+)?)
+  | (?P<number>\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+  | (?P<func>[A-Za-z_][A-Za-z0-9_.]*)(?=\()
+  | (?P<bool>TRUE|FALSE)\b
+  | (?P<op><>|<=|>=|[-+*/^&=<>(),%])
+''', re.VERBOSE)
+
+
+def _tokenize(text: str) -> list:
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if not match:
+            raise FormulaError(f"Не удалось разобрать формулу: {text!r}, позиция {pos}")
+        pos = match.end()
+        kind = match.lastgroup
+        if kind != "space":
+            tokens.append((kind, match.group(kind)))
+    return tokens
+
+
+def _split_ref(ref: str) -> tuple:
+    """'Данные!$B$5' -> ('Данные', 'B5'); лист None - текущий."""
+    sheet = None
+    if "!" in ref:
+        sheet, ref = ref.rsplit("!", 1)
+        sheet = sheet.strip("'")
+    return sheet, ref.replace("$", "")
+
+
+class _Parser:
+    """Разбор формулы в дерево из кортежей; приоритеты операций как в Excel."""
+
+    def __init__(self, tokens: list):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, value=None):
+        kind, token = self.peek()
+        if kind is None or (value is not None and token != value):
+            raise FormulaError(f"Ожидалось {value!r}, получено {token!r}")
+        self.pos += 1
+        return kind, token
+
+    def parse(self):
+        node = self.comparison()
+        if self.pos != len(self.tokens):
+            raise FormulaError(f"Лишние символы в формуле: {self.peek()[1]!r}")
+        return node
+
+    def comparison(self):
+        node = self.concat()
+        while self.peek()[1] in ("=", "<>", "<", ">", "<=", ">="):
+            op = self.take()[1]
+            node = ("bin", op, node, self.concat())
+        return node
+
+    def concat(self):
+        node = self.additive()
+        while self.peek()[1] == "&":
+            self.take()
+            node = ("bin", "&", node, self.additive())
+        return node
+
+    def additive(self):
+        node = self.term()
+        while self.peek()[1] in ("+", "-"):
+            op = self.take()[1]
+            node = ("bin", op, node, self.term())
+        return node
+
+    def term(self):
+        node = self.power()
+        while self.peek()[1] in ("*", "/"):
+            op = self.take()[1]
+            node = ("bin", op, node, self.power())
+        return node
+
+    def power(self):
+        node = self.unary()
+        while self.peek()[1] == "^":
+            self.take()
+            node = ("bin", "^", node, self.unary())
+        return node
+
+    def unary(self):
+        if self.peek()[1] == "-":
+            self.take()
+            return ("neg", self.unary())
+        if self.peek()[1] == "+":
+            self.take()
+            return self.unary()
+        node = self.primary()
+        if self.peek()[1] == "%":
+            self.take()
+            node = ("bin", "/", node, ("num", 100))
+        return node
+
+    def primary(self):
+        kind, token = self.take()
+        if kind == "number":
+            return ("num", float(token))
+        if kind == "string":
+            return ("str", token[1:-1].replace('""', '"'))
+        if kind == "bool":
+            return ("num", token == "TRUE")
+        if kind == "ref":
+            sheet, ref = _split_ref(token)
+            if ":" in ref:
+                first, last = ref.split(":")
+                return ("range", sheet, first, last)
+            return ("ref", sheet, ref)
+        if kind == "func":
+            self.take("(")
+            args = []
+            if self.peek()[1] != ")":
+                args.append(self.comparison())
+                while self.peek()[1] == ",":
+                    self.take()
+                    args.append(self.comparison())
+            self.take(")")
+            return ("func", token.upper(), args)
+        if token == "(":
+            node = self.comparison()
+            self.take(")")
+            return node
+        raise FormulaError(f"Неожиданный символ в формуле: {token!r}")
+
+
+@lru_cache(maxsize=4096)
+def parse_formula(formula: str):
+    """Разбирает формулу ('=...') один раз, дерево переиспользуется для всех строк."""
+    return _Parser(_tokenize(formula.lstrip("="))).parse()
+
+
+def to_number(value) -> float:
+    if value is None or value == "":
+        return 0.0
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        # В шаблонах числа бывают строками с запятой: '343,682'
+        return float(str(value).strip().replace(",", "."))
+    except ValueError:
+        raise FormulaError(f"Значение не является числом: {value!r}")
+
+
+def to_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "ИСТИНА" if value else "ЛОЖЬ"
+    if isinstance(value, float):
+        if value.is_integer():
+            return str(int(value))
+        return repr(round(value, 10)).replace(".", ",")
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%d.%m.%Y")
+    if isinstance(value, datetime.date):
+        return value.strftime("%d.%m.%Y")
+    return str(value)
+
+
+def excel_round(value, digits, rounding=ROUND_HALF_UP) -> float:
+    """Округление как в Excel: половины и ROUNDUP - от нуля."""
+    quantum = Decimal(1).scaleb(-int(to_number(digits)))
+    return float(Decimal(repr(to_number(value))).quantize(quantum, rounding=rounding))
+
+
+class FormulaEvaluator:
+    """
+    Вычисляет формулы книги без Excel.
+    sheets - {имя листа: {координата: значение или формула}}.
+    """
+
+    def __init__(self, sheets: dict, rng: random.Random = None):
+        self.sheets = sheets
+        self.rng = rng or random
+        self.cache = {}
+
+    def set_value(self, sheet: str, coord: str, value):
+        self.sheets.setdefault(sheet, {})[coord] = value
+        self.cache.clear()
+
+    def value(self, sheet: str, coord: str):
+        """Значение ячейки с учетом формул (результат запоминается)."""
+        key = (sheet, coord)
+        if key not in self.cache:
+            raw = self.sheets.get(sheet, {}).get(coord)
+            if isinstance(raw, str) and raw.startswith("="):
+                self.cache[key] = None  # защита от циклических ссылок
+                raw = self.eval_node(parse_formula(raw), sheet)
+            self.cache[key] = raw
+        return self.cache[key]
+
+    def range_values(self, sheet: str, first: str, last: str) -> list:
+        first_col, first_row = coordinate_from_string(first)
+        last_col, last_row = coordinate_from_string(last)
+        columns = range(column_index_from_string(first_col), column_index_from_string(last_col) + 1)
+        return [
+            [self.value(sheet, f"{get_column_letter(col)}{row}") for col in columns]
+            for row in range(first_row, last_row + 1)
+        ]
+
+    def eval_node(self, node, sheet: str):
+        kind = node[0]
+        if kind in ("num", "str"):
+            return node[1]
+        if kind == "ref":
+            return self.value(node[1] or sheet, node[2])
+        if kind == "range":
+            return self.range_values(node[1] or sheet, node[2], node[3])
+        if kind == "neg":
+            return -to_number(self.eval_node(node[1], sheet))
+        if kind == "bin":
+            return self.eval_binary(node[1], self.eval_node(node[2], sheet), self.eval_node(node[3], sheet))
+        if kind == "func":
+            return self.eval_function(node[1], node[2], sheet)
+        raise FormulaError(f"Неизвестный узел формулы: {kind}")
+
+    def eval_binary(self, op: str, left, right):
+        if op == "&":
+            return to_text(left) + to_text(right)
+        if op in ("=", "<>", "<", ">", "<=", ">="):
+            if isinstance(left, str) or isinstance(right, str):
+                left, right = to_text(left).lower(), to_text(right).lower()
+            else:
+                left, right = to_number(left), to_number(right)
+            return {
+                "=": left == right, "<>": left != right,
+                "<": left < right, ">": left > right,
+                "<=": left <= right, ">=": left >= right,
+            }[op]
+        left, right = to_number(left), to_number(right)
+        if op == "+":
+            return left + right
+        if op == "-":
+            return left - right
+        if op == "*":
+            return left * right
+        if op == "/":
+            if right == 0:
+                raise FormulaError("Деление на ноль в формуле")
+            return left / right
+        if op == "^":
+            return left ** right
+        raise FormulaError(f"Неизвестная операция: {op}")
+
+    def eval_function(self, name: str, args: list, sheet: str):
+        # IF вычисляет только нужную ветку
+        if name == "IF":
+            condition = self.eval_node(args[0], sheet)
+            if to_number(condition) if not isinstance(condition, str) else condition:
+                return self.eval_node(args[1], sheet) if len(args) > 1 else True
+            return self.eval_node(args[2], sheet) if len(args) > 2 else False
+
+        values = [self.eval_node(arg, sheet) for arg in args]
+        if name == "ROUND":
+            return excel_round(values[0], values[1])
+        if name == "ROUNDUP":
+            return excel_round(values[0], values[1], ROUND_UP)
+        if name == "ROUNDDOWN":
+            return excel_round(values[0], values[1], ROUND_DOWN)
+        if name == "RANDBETWEEN":
+            return float(self.rng.randint(int(to_number(values[0])), int(to_number(values[1]))))
+        if name in ("CONCATENATE", "CONCAT"):
+            return "".join(to_text(value) for value in values)
+        if name == "TODAY":
+            return datetime.date.today()
+        if name in ("SUM", "MAX", "MIN"):
+            numbers = [to_number(item) for item in _flatten(values) if item is not None and item != ""]
+            if name == "SUM":
+                return sum(numbers)
+            return (max if name == "MAX" else min)(numbers) if numbers else 0.0
+        if name == "ABS":
+            return abs(to_number(values[0]))
+        if name == "AND":
+            return all(to_number(item) for item in _flatten(values))
+        if name == "OR":
+            return any(to_number(item) for item in _flatten(values))
+        if name == "NOT":
+            return not to_number(values[0])
+        if name == "INDEX":
+            table = values[0]
+            row = int(to_number(values[1])) if len(values) > 1 else 1
+            col = int(to_number(values[2])) if len(values) > 2 else 1
+            if len(table) == 1 and len(values) == 2:
+                row, col = 1, row  # одна строка - индекс по столбцу
+            try:
+                return table[row - 1][col - 1]
+            except IndexError:
+                raise FormulaError("INDEX: индекс вне диапазона")
+        if name == "MATCH":
+            lookup = to_text(values[0]).lower()
+            for position, item in enumerate(_flatten([values[1]]), start=1):
+                if to_text(item).lower() == lookup:
+                    return float(position)
+            raise FormulaError(f"MATCH: значение {values[0]!r} не найдено")
+        raise FormulaError(f"Функция {name} не поддерживается")
+
+
+def _flatten(values: list):
+    for value in values:
+        if isinstance(value, list):
+            yield from _flatten(value)
+        else:
+            yield value
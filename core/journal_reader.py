@@ -0,0 +1,157 @@
+import os
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils.cell import column_index_from_string
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel
+
+from EI_protocols_utils.utils.constants import JOURNAL_WORKSHEET
+from core.records import JOURNAL_WIDTH, JournalRecord
+
+NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_COLUMN_RE = re.compile(r"[A-Z]+")
+
+
+class JournalReader:
+    """
+    Потоковое чтение листа журнала прямо из XML внутри xlsx.
+    Строки до from_row пропускаются без создания ячеек, после to_row чтение
+    прекращается, наружу отдаются кортежи значений - как iter_rows(values_only=True).
+    """
+
+    def __init__(self, path, sheet_name: str = JOURNAL_WORKSHEET):
+        self.path = path
+        self.sheet_name = sheet_name
+        self._meta_key = None  # (размер, mtime) файла, для которого прочитаны служебные части
+        # Последняя строка, которая есть в XML листа, по итогам iter_rows (а не по <dimension>,
+        # который бывает устаревшим). Строки после нее отдаются пустыми - их в журнале нет.
+        self.last_row = None
+
+    def _load_meta(self, archive: zipfile.ZipFile):
+        """Путь к листу, общие строки и стили дат; перечитываются, только если файл изменился."""
+        stat = os.stat(self.path)
+        key = (stat.st_size, stat.st_mtime)
+        if key == self._meta_key:
+            return
+        workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+        rels = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+        targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(f"{PKG_REL_NS}Relationship")}
+
+        self.sheet_xml = None
+        for sheet in workbook.iter(f"{NS}sheet"):
+            if sheet.get("name") == self.sheet_name:
+                target = targets[sheet.get(f"{REL_NS}id")]
+                self.sheet_xml = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("xl", target))
+        if not self.sheet_xml:
+            raise KeyError(f"Лист {self.sheet_name} не найден в журнале {self.path}")
+
+        properties = workbook.find(f"{NS}workbookPr")
+        date1904 = properties is not None and properties.get("date1904") in ("1", "true")
+        self.epoch = CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900
+
+        self.shared_strings = []
+        if "xl/sharedStrings.xml" in archive.namelist():
+            with archive.open("xl/sharedStrings.xml") as f:
+                for _, elem in ET.iterparse(f):
+                    if elem.tag == f"{NS}si":
+                        self.shared_strings.append("".join(t.text or "" for t in elem.iter(f"{NS}t")))
+                        elem.clear()
+
+        # Индексы стилей ячеек, у которых формат - дата
+        self.date_styles = set()
+        if "xl/styles.xml" in archive.namelist():
+            styles = ET.fromstring(archive.read("xl/styles.xml"))
+            custom_formats = {
+                int(fmt.get("numFmtId")): fmt.get("formatCode")
+                for fmt in styles.iter(f"{NS}numFmt")
+            }
+            cell_xfs = styles.find(f"{NS}cellXfs")
+            if cell_xfs is not None:
+                for index, xf in enumerate(cell_xfs.iter(f"{NS}xf")):
+                    fmt_id = int(xf.get("numFmtId", 0))
+                    fmt = custom_formats.get(fmt_id, BUILTIN_FORMATS.get(fmt_id))
+                    if fmt and is_date_format(fmt):
+                        self.date_styles.add(index)
+        self._meta_key = key
+
+    def _cell_value(self, cell):
+        cell_type = cell.get("t", "n")
+        if cell_type == "inlineStr":
+            return "".join(t.text or "" for t in cell.iter(f"{NS}t"))
+        value = cell.find(f"{NS}v")
+        if value is None or value.text is None:
+            return None
+        text = value.text
+        if cell_type == "s":
+            return self.shared_strings[int(text)]
+        if cell_type in ("str", "e"):
+            return text
+        if cell_type == "b":
+            return text == "1"
+        number = float(text) if any(ch in text for ch in ".eE") else int(text)
+        if int(cell.get("s", 0)) in self.date_styles:
+            return from_excel(number, self.epoch)
+        return number
+
+    def iter_rows(self, min_row: int = 1, max_row: int = None, width: int = 0):
+        """Кортежи значений строк min_row..max_row (нумерация с 1, пустые строки тоже отдаются)."""
+        self.last_row = None
+        with zipfile.ZipFile(self.path) as archive:
+            self._load_meta(archive)
+            with archive.open(self.sheet_xml) as f:
+                expected = min_row
+                row_number = 0
+                sheet_data = None
+                for event, elem in ET.iterparse(f, events=("start", "end")):
+                    if event == "start":
+                        if elem.tag == f"{NS}sheetData":
+                            sheet_data = elem
+                        continue
+                    if elem.tag != f"{NS}row":
+                        continue
+                    row_number = int(elem.get("r", row_number + 1))
+                    if row_number >= min_row:
+                        if max_row is not None and row_number > max_row:
+                            self.last_row = row_number
+                            break
+                        # Пропущенные в XML (пустые) строки
+                        while expected < row_number:
+                            yield (None,) * width
+                            expected += 1
+                        yield self._row_values(elem, width)
+                        expected = row_number + 1
+                    # Разобранные строки больше не нужны - память не растет
+                    sheet_data.clear()
+                else:
+                    self.last_row = row_number
+                if max_row is not None:
+                    while expected <= max_row:
+                        yield (None,) * width
+                        expected += 1
+
+    def _row_values(self, row, width: int) -> tuple:
+        values = [None] * width
+        index = -1
+        for cell in row.iter(f"{NS}c"):
+            ref = cell.get("r")
+            # Адрес ячейки необязателен - тогда она идет следом за предыдущей
+            index = column_index_from_string(_COLUMN_RE.match(ref).group()) - 1 if ref else index + 1
+            if index >= len(values):
+                values.extend([None] * (index + 1 - len(values)))
+            values[index] = self._cell_value(cell)
+        return tuple(values)
+
+    def iter_records(self, min_row: int = 2, max_row: int = None):
+        """Строки min_row..max_row как JournalRecord - без промежуточных списков значений."""
+        for row_number, row in enumerate(self.iter_rows(min_row, max_row, width=JOURNAL_WIDTH), start=min_row):
+            yield JournalRecord(row_number, row)
+
+    def header(self) -> tuple:
+        """Первая строка с названиями столбцов."""
+        return next(self.iter_rows(1, 1))
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from core.snapshot import load_journal_frame
+
+
+def row_fingerprints(df: pd.DataFrame) -> np.ndarray:
+    """Хэш каждой строки по тексту ячеек: одинаковые значения дают одинаковый хэш, как бы их ни прочитал pandas."""
+    if df.empty:
+        return np.empty(0, dtype=np.uint64)
+    return pd.util.hash_pandas_object(df.astype(str), index=False).to_numpy()
+
+
+class JournalDiff:
+    """
+    Чем перечитанный журнал отличается от показанного: измененные строки (позиции в таблице)
+    и число дописанных в конец. reset - таблицу нужно пересоздать целиком
+    (поменялись столбцы или строки удалены).
+    """
+
+    def __init__(self, df: pd.DataFrame, fingerprints: np.ndarray, changed: list, appended: int, reset: bool,
+                 base: np.ndarray = None):
+        self.df = df
+        self.base = base  # хэши, с которыми сравнивали: разница верна только для той же таблицы
+        self.fingerprints = fingerprints
+        self.changed = changed
+        self.appended = appended
+        self.reset = reset
+
+    @property
+    def empty(self) -> bool:
+        return not (self.changed or self.appended or self.reset)
+
+
+def diff_journal(path, columns, fingerprints: np.ndarray) -> JournalDiff:
+    """Перечитывает журнал (через снимок) и сравнивает построчные хэши с прежними."""
+    df = load_journal_frame(path)
+    new_fingerprints = row_fingerprints(df)
+    old_len = len(fingerprints)
+    if list(df.columns) != list(columns) or len(df) < old_len:
+        return JournalDiff(df, new_fingerprints, [], 0, reset=True, base=fingerprints)
+    changed = np.flatnonzero(new_fingerprints[:old_len] != fingerprints).tolist()
+    return JournalDiff(df, new_fingerprints, changed, len(df) - old_len, reset=False, base=fingerprints)
+
+
+def row_runs(rows: list) -> list:
+    """Отсортированные номера строк -> непрерывные отрезки [(первая, последняя)]."""
+    runs = []
+    for row in rows:
+        if runs and row == runs[-1][1] + 1:
+            runs[-1][1] = row
+        else:
+            runs.append([row, row])
+    return [tuple(run) for run in runs]
@@ -0,0 +1,36 @@
+from EI_protocols_utils.utils.constants import WATER_METER_PROTOTOCOL_SEETNAME
+from core.formulas import FormulaEvaluator
+
+QMAX_TITLE = "Измерения на расходе Qнаиб , л/ч"
+# Строки замеров на Qнаиб в разных раскладках шаблонов (заголовок -> строки с расходом)
+QMAX_LAYOUTS = {
+    "B55": (53, 54, 55),
+    "B59": (59, 60, 61),
+}
+
+
+def compute_measurements(cells: dict, rng=None) -> dict:
+    """
+    Вычисляет расходы на Qнаиб по формулам шаблона.
+    Возвращает {"flows": {координата: расход}, "max_flow": наибольший расход}.
+    """
+    protocol_cells = cells[WATER_METER_PROTOTOCOL_SEETNAME]
+    for title_cell, rows in QMAX_LAYOUTS.items():
+        if QMAX_TITLE in str(protocol_cells.get(title_cell)):
+            break
+    else:
+        raise Exception("Не удалось определить максимальный расход из шаблона. "\
+            "Убедитесь, что шаблон протокола содержит результаты расхода измерений в B53-B55, или AC59-AC61")
+
+    # Листы копируются поверхностно: вычисления не должны портить кэш шаблона
+    evaluator = FormulaEvaluator({name: dict(sheet) for name, sheet in cells.items()}, rng=rng)
+    flows = {
+        f"AC{row}": float(evaluator.value(WATER_METER_PROTOTOCOL_SEETNAME, f"AC{row}"))
+        for row in rows
+    }
+    return {"flows": flows, "max_flow": max(flows.values())}
+
+
+def flow_range_text(max_flow: float) -> str:
+    """Текст для столбца 41 журнала."""
+    return f"Поверен в диапазоне расхода (0,03-{round(max_flow, 3)}) м3/ч"
@@ -0,0 +1,100 @@
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+
+from core.fileio import atomic_write_json
+
+CACHE_NAME = ".protocol_cache.json"
+
+
+def protocol_key(protocol_kwargs: dict, template_digest: str, backend: str) -> str:
+    """Ключ протокола: хэш всех входных полей (с погодой, годом и диапазоном), шаблона и бэкенда."""
+    payload = json.dumps(
+        {"kwargs": protocol_kwargs, "template": template_digest, "backend": backend},
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def final_kwargs(protocol_kwargs: dict, measurements: dict) -> dict:
+    """
+    Параметры в том виде, в каком их соберет следующий прогон: рассчитанный диапазон
+    расхода записывается в журнал с округлением и при повторе приходит уже заданным.
+    """
+    if not measurements:
+        return protocol_kwargs
+    return dict(protocol_kwargs, range=str(round(measurements["max_flow"], 3)))
+
+
+class OutputCache:
+    """
+    Индекс готовых протоколов в корне папки протоколов: ключ -> файлы.
+    Запись верна, пока оба файла на месте и не менялись (размер и mtime),
+    иначе протокол создается заново.
+    """
+
+    def __init__(self, protocols_path):
+        self.root = Path(protocols_path)
+        self.path = self.root / CACHE_NAME
+        self.entries = None
+        self.dirty = False
+
+    def load(self):
+        if self.entries is not None:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+
+    def _stat(self, path: Path) -> list:
+        stat = path.stat()
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _relative(self, path) -> str:
+        path = Path(path)
+        try:
+            return str(path.relative_to(self.root))
+        except ValueError:
+            return str(path)
+
+    def get(self, key: str) -> tuple:
+        """(xlsx, pdf) готового протокола с этим ключом или None."""
+        self.load()
+        entry = self.entries.get(key)
+        if not entry:
+            return None
+        paths = tuple(self.root / entry[name] for name in ("xlsx", "pdf"))
+        try:
+            if [self._stat(path) for path in paths] == entry["stat"]:
+                return paths
+        except OSError:
+            pass
+        # Файлы пропали или изменены - запись больше не верна
+        del self.entries[key]
+        self.dirty = True
+        return None
+
+    def put(self, key: str, xlsx_path, pdf_path):
+        self.load()
+        paths = (Path(xlsx_path), Path(pdf_path))
+        # Старые записи на те же файлы устарели: файлы перезаписаны новым протоколом
+        relative = [self._relative(path) for path in paths]
+        for old_key in [k for k, entry in self.entries.items() if entry["xlsx"] == relative[0]]:
+            del self.entries[old_key]
+        self.entries[key] = {
+            "xlsx": relative[0],
+            "pdf": relative[1],
+            "stat": [self._stat(path) for path in paths],
+            "created": datetime.now().isoformat(timespec="seconds"),
+        }
+        self.dirty = True
+
+    def save(self):
+        """Атомарно сохраняет индекс, если были изменения."""
+        if not self.dirty:
+            return
+        atomic_write_json(self.path, self.entries, indent=1)
+        self.dirty = False
@@ -0,0 +1,148 @@
+from datetime import date, datetime
+from pathlib import Path
+
+from EI_protocols_utils.utils.settings import settings
+
+# Шрифты с кириллицей: свой из настроек, иначе системный
+FONT_CANDIDATES = (
+    "C:/Windows/Fonts/arial.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+)
+BOLD_SUFFIXES = ("bd", "-Bold")
+DEFAULT_COL_WIDTH = 8.43  # ширина столбца Excel по умолчанию, символов
+DEFAULT_ROW_HEIGHT = 15.0  # высота строки Excel по умолчанию, пт
+POINTS_PER_CHAR = 5.25  # ширина одного символа столбца Excel при 100%, пт
+MIN_FONT_SIZE = 5.0
+MARGIN = 28.0  # поля страницы, пт
+
+
+def _find_font():
+    for candidate in (getattr(settings, "pdf_font_path", None), *FONT_CANDIDATES):
+        if candidate and Path(candidate).exists():
+            return Path(candidate)
+    raise FileNotFoundError("Не найден TTF-шрифт с кириллицей. Укажите pdf_font_path в config.yaml")
+
+
+def _register_fonts() -> tuple:
+    """Регистрирует обычный и (если найдется) жирный шрифт, возвращает их имена."""
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    font_path = _find_font()
+    regular, bold = "ProtocolFont", "ProtocolFont"
+    if regular not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(regular, str(font_path)))
+    for suffix in BOLD_SUFFIXES:
+        bold_path = font_path.with_name(font_path.stem + suffix + font_path.suffix)
+        if bold_path.exists():
+            bold = "ProtocolFont-Bold"
+            if bold not in pdfmetrics.getRegisteredFontNames():
+                pdfmetrics.registerFont(TTFont(bold, str(bold_path)))
+            break
+    return regular, bold
+
+
+def _column_widths(wsheet, max_col: int) -> list:
+    """Ширины столбцов; одна запись column_dimensions может описывать диапазон столбцов."""
+    widths = {}
+    for dimension in wsheet.column_dimensions.values():
+        first = dimension.min or 1
+        for col in range(first, (dimension.max or first) + 1):
+            widths[col] = dimension.width
+    return [widths.get(col) or DEFAULT_COL_WIDTH for col in range(1, max_col + 1)]
+
+
+def _cell_text(value, number_format: str) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%d.%m.%Y")
+    if isinstance(value, float):
+        if value.is_integer() and "0.0" not in number_format:
+            return str(int(value))
+        decimals = number_format.split(".")[1].count("0") if "." in number_format else None
+        text = f"{value:.{decimals}f}" if decimals else str(round(value, 6))
+        return text.replace(".", ",")
+    return str(value)
+
+
+def sheet_to_pdf(wsheet, pdf_path):
+    """
+    Печатает лист протокола в PDF без Excel: ячейки раскладываются по ширинам
+    столбцов и высотам строк листа, объединенные ячейки дают ширину текста.
+    Это упрощенная печать - рамки и заливки не переносятся.
+    """
+    try:
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.utils import simpleSplit
+        from reportlab.pdfgen import canvas
+    except ImportError as e:
+        raise ImportError("Для создания PDF без Excel нужен пакет reportlab: pip install reportlab") from e
+
+    regular, bold = _register_fonts()
+
+    max_col = max((cell.column for row in wsheet.iter_rows() for cell in row if cell.value is not None), default=1)
+    max_row = max((cell.row for row in wsheet.iter_rows() for cell in row if cell.value is not None), default=1)
+    widths = _column_widths(wsheet, max_col)
+    page_width, page_height = A4
+    scale = (page_width - 2 * MARGIN) / sum(widths)
+    lefts = [MARGIN]
+    for width in widths:
+        lefts.append(lefts[-1] + width * scale)
+
+    # Верхняя левая ячейка объединения -> (последний столбец, последняя строка); остальные пропускаем
+    merged, covered = {}, set()
+    for merged_range in wsheet.merged_cells.ranges:
+        merged[(merged_range.min_row, merged_range.min_col)] = (merged_range.max_col, merged_range.max_row)
+        for row in range(merged_range.min_row, merged_range.max_row + 1):
+            for col in range(merged_range.min_col, merged_range.max_col + 1):
+                if (row, col) != (merged_range.min_row, merged_range.min_col):
+                    covered.add((row, col))
+
+    # Высоты строк и шрифты ужимаются тем же масштабом, что и ширины
+    row_scale = min(1.0, scale / POINTS_PER_CHAR)
+    heights = {}
+    for row in range(1, max_row + 1):
+        dimension = wsheet.row_dimensions.get(row)
+        heights[row] = ((dimension.height if dimension else None) or DEFAULT_ROW_HEIGHT) * row_scale
+
+    pdf = canvas.Canvas(str(pdf_path), pagesize=A4)
+    top = page_height - MARGIN
+    for row in range(1, max_row + 1):
+        row_height = heights[row]
+        if top - row_height < MARGIN:
+            pdf.showPage()
+            top = page_height - MARGIN
+        for col in range(1, max_col + 1):
+            if (row, col) in covered:
+                continue
+            cell = wsheet.cell(row, col)
+            text = _cell_text(cell.value, cell.number_format or "")
+            if not text:
+                continue
+            last_col, last_row = merged.get((row, col), (col, row))
+            left, right = lefts[col - 1], lefts[min(last_col, max_col)]
+            box_height = sum(heights.get(r, 0) for r in range(row, last_row + 1))
+
+            font = bold if cell.font and cell.font.b else regular
+            size = max(MIN_FONT_SIZE, (cell.font.sz if cell.font and cell.font.sz else 11) * row_scale)
+            wrap = bool(cell.alignment and cell.alignment.wrap_text) or last_col > col
+            lines = simpleSplit(text, font, size, right - left) if wrap else [text]
+            leading = size * 1.15
+            # Текст, не влезший в строку, раздвигает ее
+            row_height = max(row_height, len(lines) * leading - (box_height - heights[row]))
+
+            horizontal = cell.alignment.horizontal if cell.alignment else None
+            pdf.setFont(font, size)
+            y = top - max(leading, (box_height - len(lines) * leading) / 2 + leading) + size * 0.2
+            for line in lines:
+                if horizontal in ("center", "centerContinuous"):
+                    pdf.drawCentredString((left + right) / 2, y, line)
+                elif horizontal == "right":
+                    pdf.drawRightString(right, y, line)
+                else:
+                    pdf.drawString(left + 1, y, line)
+                y -= leading
+        top -= row_height
+    pdf.save()
+    return pdf_path
@@ -0,0 +1,136 @@
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from core.records import records_frame
+from core.templates import template_registry
+
+# Поля, которые prepare_row разбирает как числа
+NUMERIC_FIELDS = ("temperature", "pressure", "humidity", "readings")
+DATE_FORMAT = "%d.%m.%Y"
+_RANGE_RE = r"\(([^-]+)-([^)]+)\)"
+
+
+def is_empty(series: pd.Series) -> pd.Series:
+    """Пустая ячейка в понимании validate_row: None, NaN или пустая строка."""
+    return series.isna() | series.astype(str).str.strip().eq("")
+
+
+def parse_numbers(series: pd.Series) -> pd.Series:
+    """Как в prepare_row: запятая -> точка, все кроме цифр и точки выбрасывается, NaN - не число."""
+    cleaned = series.astype(str).str.replace(",", ".", regex=False).str.replace(r"[^0-9.]", "", regex=True)
+    return pd.to_numeric(cleaned, errors="coerce")
+
+
+class DryRunReport:
+    """Итог проверки диапазона строк: ошибки не дадут создать протокол, предупреждения - повод проверить строку."""
+
+    def __init__(self, rows_checked: int):
+        self.rows_checked = rows_checked
+        self.errors = {}    # номер строки -> [сообщения]
+        self.warnings = {}  # номер строки -> [сообщения]
+        self.seconds = 0.0
+
+    def add(self, kind: dict, row_numbers, message):
+        """Добавляет сообщение строкам; message - строка или функция от номера строки."""
+        for row_number in row_numbers:
+            kind.setdefault(int(row_number), []).append(message(row_number) if callable(message) else message)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def text(self) -> str:
+        lines = [
+            f"Проверено строк: {self.rows_checked} за {self.seconds:.2f} с. "
+            f"С ошибками: {len(self.errors)}, с предупреждениями: {len(self.warnings)}"
+        ]
+        for title, issues in (("Ошибки", self.errors), ("Предупреждения", self.warnings)):
+            if issues:
+                lines.append(f"\n{title}:")
+                for row_number in sorted(issues):
+                    lines.append(f" - строка {row_number}: {'; '.join(issues[row_number])}")
+        return "\n".join(lines)
+
+
+def dry_run(records: list, titles: dict, required_fields: list) -> DryRunReport:
+    """
+    Проверка записей журнала до создания протоколов - одним проходом по столбцам:
+    обязательные поля, числа (погода, показания), дата, год регистрации и год выпуска,
+    диапазон расхода и наличие шаблона. Записи не изменяются.
+    titles - названия полей для сообщений (field_titles по заголовку журнала).
+    """
+    start = time.perf_counter()
+    report = DryRunReport(len(records))
+    if not records:
+        return report
+
+    df = records_frame(records)
+    name_of = lambda field: titles.get(field, field)
+
+    # Обязательные поля
+    empty = pd.DataFrame({field: is_empty(df[field]) for field in required_fields})
+    missing = empty[empty.any(axis=1)]
+    for row_number, flags in missing.iterrows():
+        fields = ", ".join(name_of(field) for field, flag in flags.items() if flag)
+        report.errors.setdefault(int(row_number), []).append(f"Пропущены поля: {fields}")
+    filled = lambda field: ~empty[field] if field in empty else ~is_empty(df[field])
+
+    # Номер протокола "ЕИ-03-02-01180": табельный номер и номер протокола берутся из частей
+    protocol_ids = df["protocol_id"].astype(str)
+    bad_ids = filled("protocol_id") & (protocol_ids.str.count("-") < 2)
+    report.add(report.errors, df.index[bad_ids], lambda row: f"Номер протокола не по форме ЕИ-03-02-00000: {df.at[row, 'protocol_id']!r}")
+
+    # Числа: погода может быть пустой (заполнится из журнала погоды), показания - нет
+    for field in NUMERIC_FIELDS:
+        bad = filled(field) & parse_numbers(df[field]).isna()
+        report.add(report.errors, df.index[bad], lambda row, field=field: f"{name_of(field)} - не число: {df.at[row, field]!r}")
+
+    # Дата поверки: либо дата, либо текст дд.мм.гггг
+    dates = df["date"]
+    text_dates = filled("date") & ~dates.map(lambda value: isinstance(value, datetime))
+    parsed = pd.to_datetime(dates[text_dates].astype(str).str.strip(), format=DATE_FORMAT, errors="coerce")
+    report.add(report.errors, parsed.index[parsed.isna()], lambda row: f"Дата не в формате дд.мм.гггг: {df.at[row, 'date']!r}")
+
+    # Год регистрации из "47204-11" и год выпуска
+    registers = df["register_number"].astype(str)
+    register_2d = pd.to_numeric(registers.str.split("-").str[-1].str.strip(), errors="coerce")
+    bad_register = filled("register_number") & (register_2d.isna() | ~registers.str.contains("-", regex=False))
+    report.add(report.errors, df.index[bad_register], lambda row: f"Не удалось определить год из рег. номера: {df.at[row, 'register_number']!r}")
+    register_year = (register_2d + 2000).where(register_2d <= 25, register_2d + 1900)
+
+    years = pd.to_numeric(df["year"].astype(str).str.strip(), errors="coerce")
+    has_year = filled("year")
+    bad_year = has_year & (years.isna() | (years % 1 != 0))
+    report.add(report.errors, df.index[bad_year], lambda row: f"Год выпуска - не целое число: {df.at[row, 'year']!r}")
+    current_year = datetime.now().year
+    early = has_year & ~bad_year & ~bad_register & (years < register_year)
+    report.add(report.warnings, df.index[early],
+               lambda row: f"Год выпуска {int(years[row])} раньше года регистрации типа {int(register_year[row])}")
+    future = has_year & ~bad_year & (years > current_year)
+    report.add(report.warnings, df.index[future], lambda row: f"Год выпуска {int(years[row])} в будущем")
+
+    # Диапазон расхода, если уже записан: "Поверен в диапазоне расхода (0,03-0,954) м3/ч"
+    has_range = filled("flow_range")
+    upper = pd.to_numeric(
+        df["flow_range"][has_range].astype(str).str.extract(_RANGE_RE)[1].str.replace(",", ".", regex=False).str.strip(),
+        errors="coerce",
+    )
+    report.add(report.errors, upper.index[upper.isna()], lambda row: f"Не разобран диапазон расхода: {df.at[row, 'flow_range']!r}")
+
+    # Шаблоны - по одному поиску на уникальную пару (рег. номер, наименование)
+    checked = filled("register_number") & filled("name")
+    pairs = pd.Series(list(zip(registers, df["name"].astype(str))), index=df.index)[checked]
+    found = {}
+    for register_number, name in pairs.unique():
+        try:
+            template_registry.find(register_number, name)
+            found[(register_number, name)] = True
+        except FileNotFoundError:
+            found[(register_number, name)] = False
+    no_template = pairs[~pairs.map(found.get).astype(bool)]
+    report.add(report.errors, no_template.index, lambda row: f"Нет шаблона для {df.at[row, 'name']} ({df.at[row, 'register_number']})")
+
+    report.seconds = time.perf_counter() - start
+    return report
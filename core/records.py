@@ -0,0 +1,73 @@
+import pandas as pd
+
+# Столбцы журнала, с которыми работает конвейер: поле записи -> индекс столбца (с 0)
+JOURNAL_FIELDS = {
+    "protocol_id": 0,       # "ЕИ-03-02-01180"
+    "copies": 1,
+    "register_number": 2,   # "47204-11"
+    "name": 5,
+    "serial": 7,
+    "date": 9,
+    "next_date": 10,
+    "si_numbers": 12,
+    "result": 13,           # "Пригодно" / "Непригодно"
+    "temperature": 14,
+    "pressure": 15,
+    "humidity": 16,
+    "method": 21,
+    "address": 32,
+    "sheets": 34,
+    "verifier": 35,
+    "reasons": 38,
+    "flow_range": 41,       # "Поверен в диапазоне расхода (0,03-0,954) м3/ч"
+    "year": 44,
+    "readings": 45,
+    "owner": 47,
+    "unit_type": 48,
+}
+JOURNAL_WIDTH = max(JOURNAL_FIELDS.values()) + 1
+
+
+class JournalRecord:
+    """
+    Строка журнала: только нужные конвейеру столбцы, как атрибуты со __slots__.
+    Исходные значения запоминаются, в журнал записываются только измененные поля.
+    """
+
+    __slots__ = ("row_number", "_original") + tuple(JOURNAL_FIELDS)
+
+    def __init__(self, row_number: int, row):
+        self.row_number = row_number
+        width = len(row)
+        self._original = tuple(row[col] if col < width else None for col in JOURNAL_FIELDS.values())
+        for field, value in zip(JOURNAL_FIELDS, self._original):
+            setattr(self, field, value)
+
+    def changes(self) -> dict:
+        """Измененные поля как {индекс столбца: значение} - для записи в журнал и в таблицу."""
+        return {
+            JOURNAL_FIELDS[field]: getattr(self, field)
+            for field, original in zip(JOURNAL_FIELDS, self._original)
+            if getattr(self, field) != original
+        }
+
+    def __repr__(self):
+        return f"JournalRecord(row={self.row_number}, protocol_id={self.protocol_id!r})"
+
+
+def field_titles(header) -> dict:
+    """Названия полей по заголовку журнала - для сообщений об ошибках."""
+    header = list(header or ())
+    return {
+        field: str(header[col]) if col < len(header) and header[col] else field
+        for field, col in JOURNAL_FIELDS.items()
+    }
+
+
+def records_frame(records: list) -> pd.DataFrame:
+    """Пачка записей как столбцы (индекс - номера строк журнала) для векторных проверок."""
+    return pd.DataFrame(
+        {field: [getattr(record, field) for record in records] for field in JOURNAL_FIELDS},
+        index=[record.row_number for record in records],
+        dtype=object,
+    )
@@ -0,0 +1,95 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import atexit
+import threading
+import time
+
+from core.backends import get_backend
+from core.measurements import compute_measurements
+from core.templates import template_registry
+
+
+def render_protocol(protocol_kwargs: dict) -> tuple:
+    """
+    Создает один протокол. Выполняется и в основном процессе, и в пуле.
+    Возвращает (xlsx, pdf, время стадий, замеры): время - {"reread": расчет расхода, "render": создание},
+    замеры None, если диапазон расхода уже задан.
+    """
+    timings = {}
+    measurements = None
+    if not protocol_kwargs.get("range"):
+        # Расход считаем сами по формулам шаблона, чтобы не открывать готовый протокол
+        start = time.perf_counter()
+        template = template_registry.find(protocol_kwargs["register_number"], protocol_kwargs["name"])
+        measurements = compute_measurements(template_registry.cells(template))
+        protocol_kwargs = dict(protocol_kwargs, range=str(measurements["max_flow"]))
+        timings["reread"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    xlsx_path, pdf_path = get_backend().render(protocol_kwargs, measurements)
+    timings["render"] = time.perf_counter() - start
+    return xlsx_path, pdf_path, timings, measurements
+
+
+# Пул процессов живет всю сессию: шаблоны, разобранные в процессах, остаются в их
+# template_registry до следующего прогона, а не создаются заново каждый раз
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_workers = workers
+        return _pool
+
+
+@atexit.register
+def shutdown_pool(wait: bool = True):
+    """Останавливает пул (при выходе или если он сломался - упал процесс)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=wait, cancel_futures=True)
+            _pool = None
+
+
+def render_protocols(jobs: list, workers: int = 1):
+    """
+    Создает протоколы для списка заданий (номер строки, параметры протокола).
+    Возвращает (номер строки, результат, ошибка) по мере готовности -
+    при workers > 1 порядок завершения не совпадает с порядком строк.
+    """
+    if workers <= 1 or len(jobs) <= 1:
+        for row_number, protocol_kwargs in jobs:
+            try:
+                yield row_number, render_protocol(protocol_kwargs), None
+            except Exception as e:
+                yield row_number, None, e
+        return
+
+    pool = get_pool(workers)
+    futures = {
+        pool.submit(render_protocol, protocol_kwargs): row_number
+        for row_number, protocol_kwargs in jobs
+    }
+    try:
+        for future in as_completed(futures):
+            row_number = futures[future]
+            try:
+                yield row_number, future.result(), None
+            except BrokenProcessPool as e:
+                # Процесс пула упал - следующий прогон начнет с нового пула
+                shutdown_pool(wait=False)
+                yield row_number, None, e
+            except Exception as e:
+                yield row_number, None, e
+    finally:
+        # Прогон прерван - недоделанные задания не должны занимать общий пул
+        for future in futures:
+            future.cancel()
@@ -0,0 +1,159 @@
+import re
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+# Разделители слов в именах файлов протоколов: "... №120252935 (47204-11).pdf"
+_TOKEN_SPLIT_RE = re.compile(r"[\s№_()\[\],;]+")
+_YEAR_RE = r"^\s*([+-]?\d+)\s*$"
+
+GREEN = "green"          # протокол уже создан
+RED = "red"              # нет шаблона
+DARKCYAN = "darkcyan"    # год выпуска раньше года регистрации
+
+
+def name_tokens(name: str) -> set:
+    """Слова имени файла и их части через '-' и '.'."""
+    tokens = set()
+    for token in _TOKEN_SPLIT_RE.split(name):
+        if not token:
+            continue
+        tokens.add(token)
+        tokens.update(part for part in re.split(r"[-.]", token) if part)
+    return tokens
+
+
+def has_separators(serial: str) -> bool:
+    """Номер с разделителями внутри не уместится в одно слово имени файла."""
+    return bool(_TOKEN_SPLIT_RE.search(serial))
+
+
+def name_substrings(name: str) -> set:
+    """Все подстроки имени файла - какие заводские номера в нем встречаются."""
+    return {name[start:end] for start in range(len(name)) for end in range(start + 1, len(name) + 1)}
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class RowColorEngine:
+    """
+    Цвета строк журнала по индексам, а не перебором файлов для каждой строки.
+    Протокол есть, если заводской номер - подстрока имени какого-нибудь файла (как и раньше).
+    Номер без разделителей целиком лежит внутри одного слова имени: он ищется среди слов,
+    а если это часть слова - по триграммам слов. Только номера с разделителями
+    сверяются с именами файлов целиком. Шаблоны проверяются один раз
+    на уникальную пару (рег. номер, наименование).
+    """
+
+    def __init__(self, files=(), templates=()):
+        self.tokens = Counter()
+        self.names = Counter()
+        self.grams = None  # триграмма -> слова имен с ней; строится при первом номере не целым словом
+        self.templates = list(templates)
+        self.add_files(files)
+
+    def add_files(self, files):
+        for path in files:
+            name = Path(path).name
+            tokens = name_tokens(name)
+            if self.grams is not None:
+                for token in tokens:
+                    if not self.tokens[token]:
+                        for gram in _trigrams(token):
+                            self.grams.setdefault(gram, set()).add(token)
+            self.tokens.update(tokens)
+            self.names[name] += 1
+
+    def remove_files(self, files):
+        removed = set()
+        names = [Path(path).name for path in files]
+        for name in names:
+            tokens = name_tokens(name)
+            self.tokens.subtract(tokens)
+            self.names[name] -= 1
+            removed |= tokens
+        for token in removed:
+            if self.tokens[token] <= 0:
+                del self.tokens[token]
+                if self.grams is not None:
+                    for gram in _trigrams(token):
+                        self.grams.get(gram, set()).discard(token)
+        for name in names:
+            if self.names[name] <= 0:
+                self.names.pop(name, None)
+
+    def _in_tokens(self, serial: str) -> bool:
+        """Часть ли номер какого-нибудь слова имен файлов."""
+        if len(serial) < 3:
+            return any(serial in token for token in self.tokens)
+        if self.grams is None:
+            self.grams = {}
+            for token in self.tokens:
+                for gram in _trigrams(token):
+                    self.grams.setdefault(gram, set()).add(token)
+        candidates = None
+        for gram in sorted(_trigrams(serial), key=lambda gram: len(self.grams.get(gram, ()))):
+            tokens = self.grams.get(gram, set())
+            candidates = tokens if candidates is None else candidates & tokens
+            if not candidates:
+                return False
+        return any(serial in token for token in candidates)
+
+    def has_protocol(self, serial) -> bool:
+        """Есть ли файл протокола, в имени которого встречается этот заводской номер."""
+        if serial is None or pd.isna(serial):
+            return False
+        serial = str(serial).strip()
+        if not serial:
+            return False
+        if serial in self.tokens:
+            return True
+        if has_separators(serial):
+            return any(serial in name for name in self.names)
+        return self._in_tokens(serial)
+
+    def template_exists(self, register_number, name) -> bool:
+        register_number, name = str(register_number), str(name)
+        return any(register_number in fname and name in fname for fname in self.templates)
+
+    def compute(self, df: pd.DataFrame) -> list:
+        """Цвет каждой строки (имя цвета или None) за один проход по столбцам."""
+        if df.empty:
+            return []
+        width = len(df.columns)
+        empty = pd.Series([None] * len(df), index=df.index, dtype=object)
+        column = lambda index: df.iloc[:, index] if index < width else empty
+
+        serials = column(7)
+        registers = column(2).astype(str)
+        names = column(5).astype(str)
+
+        has_protocol = serials.map(self.has_protocol).to_numpy(dtype=bool)
+
+        pairs = pd.MultiIndex.from_arrays([registers, names])
+        known = {pair: self.template_exists(*pair) for pair in pairs.unique()}
+        template_exists = pd.Series(pairs.map(known.get), index=df.index).to_numpy(dtype=bool)
+
+        # Год регистрации из "47204-11": две цифры в конце, век по текущему году
+        register_2d = pd.to_numeric(registers.str.split("-").str[-1].str.extract(_YEAR_RE)[0], errors="coerce")
+        current_2d = datetime.now().year % 100
+        register_year = (register_2d + 2000).where(register_2d <= current_2d, register_2d + 1900)
+        year = pd.to_numeric(column(44), errors="coerce")
+        year = year.where(year != 0)  # пустой год не считается ранним
+        too_early = (year < register_year).fillna(False).to_numpy(dtype=bool)
+
+        colors = []
+        for protocol, template, early in zip(has_protocol, template_exists, too_early):
+            if protocol:
+                colors.append(GREEN)
+            elif not template:
+                colors.append(RED)
+            elif early:
+                colors.append(DARKCYAN)
+            else:
+                colors.append(None)
+        return colors
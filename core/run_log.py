@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+
+class RunLog:
+    """
+    Сообщения и прогресс прогона от рабочего потока к окну без сигнала на каждую строку.
+    Поток только складывает сообщения в очередь (и сразу пишет в файл полного лога),
+    окно забирает накопленное одной пачкой по таймеру. В очереди держится не больше
+    max_lines сообщений: если окно не успевает, старые остаются только в файле.
+    """
+
+    FLUSH_SECONDS = 1.0  # как часто сбрасывать файл лога на диск
+
+    def __init__(self, path=None, max_lines: int = 2000):
+        self.path = Path(path) if path else None
+        self.lock = threading.Lock()
+        self.lines = deque(maxlen=max_lines)
+        self.dropped = 0
+        self.rows = []        # (номер строки, изменения) для таблицы журнала
+        self.progress = None  # последнее значение, промежуточные окну не нужны
+        self.eta = None
+        self.file = None
+        self.flushed = 0.0
+
+    def write(self, text: str):
+        with self.lock:
+            if len(self.lines) == self.lines.maxlen:
+                self.dropped += 1
+            self.lines.append(text)
+            if self.path:
+                if self.file is None:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    self.file = open(self.path, "a", encoding="utf-8")
+                self.file.write(text + "\n")
+                now = time.monotonic()
+                if now - self.flushed >= self.FLUSH_SECONDS:
+                    self.file.flush()
+                    self.flushed = now
+
+    def set_progress(self, percent: int):
+        with self.lock:
+            self.progress = percent
+
+    def set_eta(self, seconds: float):
+        with self.lock:
+            self.eta = seconds
+
+    def row_updated(self, row_number: int, changes: dict):
+        with self.lock:
+            self.rows.append((row_number, changes))
+
+    def drain(self) -> dict:
+        """Накопленное с прошлого раза: {"lines", "dropped", "rows", "progress", "eta"}."""
+        with self.lock:
+            batch = {
+                "lines": list(self.lines),
+                "dropped": self.dropped,
+                "rows": self.rows,
+                "progress": self.progress,
+                "eta": self.eta,
+            }
+            self.lines.clear()
+            self.dropped = 0
+            self.rows = []
+            self.progress = self.eta = None
+        return batch
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
@@ -0,0 +1,107 @@
+import heapq
+import json
+from pathlib import Path
+
+from EI_protocols_utils.utils.settings import settings
+from core.fileio import atomic_write_json
+
+DEFAULT_SECONDS = 3.0  # оценка протокола, пока замеров нет совсем
+SMOOTHING = 0.3        # вес нового замера в скользящем среднем
+
+
+class CostModel:
+    """
+    Время создания протокола по шаблонам: скользящее среднее стадий
+    "reread" (расчет расхода) и "render" для каждого шаблона.
+    Читается один раз за запуск, сохраняется в конце прогона.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.templates = None  # имя шаблона -> {"reread", "render", "count"}
+        self.fallback = DEFAULT_SECONDS
+        self.dirty = False
+
+    def load(self):
+        if self.templates is not None:
+            return
+        self.templates = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        self.templates = data.get("templates", {})
+        # Старый формат - общий список последних времен без разбивки по шаблонам
+        if data.get("times"):
+            self.fallback = sum(data["times"]) / len(data["times"])
+
+    def add(self, template: str, timings: dict):
+        """Учитывает замер одного протокола: {"reread": ..., "render": ...}."""
+        self.load()
+        stats = self.templates.setdefault(template, {"reread": None, "render": None, "count": 0})
+        for stage, seconds in timings.items():
+            old = stats.get(stage)
+            stats[stage] = seconds if old is None else old + SMOOTHING * (seconds - old)
+        stats["count"] += 1
+        self.dirty = True
+
+    def _average(self, stage: str) -> float:
+        values = [stats[stage] for stats in self.templates.values() if stats.get(stage) is not None]
+        return sum(values) / len(values) if values else None
+
+    def estimate(self, template: str, protocol_kwargs: dict) -> float:
+        """Ожидаемое время протокола; для незнакомого шаблона - среднее по остальным."""
+        self.load()
+        stats = self.templates.get(template, {})
+        render = stats.get("render")
+        if render is None:
+            render = self._average("render") or self.fallback
+        if protocol_kwargs.get("range"):
+            return render
+        reread = stats.get("reread")
+        if reread is None:
+            reread = self._average("reread") or 0.0
+        return render + reread
+
+    def save(self):
+        """Атомарно сохраняет модель, если были новые замеры."""
+        if not self.dirty:
+            return
+        atomic_write_json(self.path, {"templates": self.templates}, indent=1)
+        self.dirty = False
+
+
+def schedule_jobs(jobs: list, template_of: dict, model: CostModel, workers: int = 1) -> list:
+    """
+    Порядок заданий (номер строки, параметры): строки одного шаблона идут подряд,
+    чтобы разобранный шаблон брался из кэша. Группы - в порядке первой строки;
+    при нескольких процессах сначала самые долгие шаблоны и задания, чтобы
+    в конце пакета процессы не ждали одно длинное задание.
+    """
+    groups = {}
+    for job in jobs:
+        groups.setdefault(template_of[job[0]], []).append(job)
+    if workers <= 1:
+        return [job for group in groups.values() for job in group]
+
+    cost = lambda template, job: model.estimate(template, job[1])
+    ordered = sorted(groups.items(), key=lambda item: -max(cost(item[0], job) for job in item[1]))
+    return [
+        job
+        for template, group in ordered
+        for job in sorted(group, key=lambda job: -cost(template, job))
+    ]
+
+
+def estimate_remaining(costs: list, workers: int = 1) -> float:
+    """Время до конца очереди: задания по порядку раздаются первому освободившемуся процессу."""
+    if not costs:
+        return 0.0
+    loads = [0.0] * max(1, min(workers, len(costs)))
+    for seconds in costs:
+        heapq.heapreplace(loads, loads[0] + seconds)
+    return max(loads)
+
+
+cost_model = CostModel(settings.protocol_times_path)
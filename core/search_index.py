@@ -0,0 +1,130 @@
+import bisect
+import re
+import time
+
+import numpy as np
+
+from core.display import format_value
+
+# Столбцы поиска: номер протокола, рег. номер, заводской номер, адрес
+SEARCH_COLUMNS = (0, 2, 7, 32)
+NGRAM = 3
+MAX_RESULTS = 200
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """Текст для поиска: без регистра, ё как е, пробелы схлопнуты."""
+    return _SPACES_RE.sub(" ", text.lower().replace("ё", "е")).strip()
+
+
+def ngrams(text: str) -> set:
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+def column_values(df, rows=None) -> list:
+    """Значения столбцов поиска (списки по столбцам) - копия, которую можно отдать в другой поток."""
+    width = len(df.columns)
+    rows = slice(None) if rows is None else list(rows)
+    count = len(df.index[rows])
+    return [df.iloc[rows, col].tolist() if col < width else [None] * count for col in SEARCH_COLUMNS]
+
+
+def texts_from_values(columns: list) -> list:
+    """Списки значений по столбцам -> тексты строк (как они видны в таблице, нормализованные)."""
+    return list(zip(*([normalize(format_value(value)) for value in values] for values in columns)))
+
+
+def row_texts(df, rows) -> list:
+    """Тексты столбцов поиска для строк таблицы."""
+    return texts_from_values(column_values(df, rows))
+
+
+class SearchIndex:
+    """
+    Поиск строк журнала по подстроке. Для запросов от 3 символов - n-граммы: списки строк
+    по каждой триграмме (numpy, пересекаются быстро), кандидаты проверяются по текущему тексту.
+    Для 1-2 символов - поиск по началу значения в отсортированном списке.
+    Изменения строк не перестраивают индекс: новые n-граммы копятся в небольшой добавке,
+    устаревшие записи основного индекса отсеивает проверка текста.
+    """
+
+    def __init__(self, texts: list):
+        start = time.perf_counter()
+        self.texts = list(texts)  # позиция строки -> тексты столбцов поиска
+        postings = {}
+        prefixes = []
+        for row, values in enumerate(self.texts):
+            grams = set()
+            for value in values:
+                if value:
+                    grams |= ngrams(value)
+                    prefixes.append((value, row))
+            for gram in grams:
+                postings.setdefault(gram, []).append(row)
+        self.postings = {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()}
+        self.extra = {}  # n-грамма -> строки, измененные или добавленные после построения
+        prefixes.sort()
+        self.prefixes = prefixes
+        self.build_seconds = time.perf_counter() - start
+
+    def update(self, rows, texts: list):
+        """Новые тексты строк (измененных или дописанных в конец таблицы)."""
+        for row, values in zip(rows, texts):
+            if row >= len(self.texts):
+                self.texts.extend([("",) * len(SEARCH_COLUMNS)] * (row + 1 - len(self.texts)))
+            self.texts[row] = values
+            for value in values:
+                if value:
+                    for gram in ngrams(value):
+                        self.extra.setdefault(gram, set()).add(row)
+                    bisect.insort(self.prefixes, (value, row))
+
+    def _candidates(self, query: str):
+        grams = sorted(ngrams(query), key=lambda gram: len(self.postings.get(gram, ())))
+        base = None
+        for gram in grams:
+            rows = self.postings.get(gram)
+            if rows is None:
+                base = None
+                break
+            base = rows if base is None else np.intersect1d(base, rows, assume_unique=True)
+            if not len(base):
+                break
+        extra = None
+        for gram in grams:
+            rows = self.extra.get(gram, set())
+            extra = rows if extra is None else extra & rows
+            if not extra:
+                break
+        base = base.tolist() if base is not None else []
+        if not extra:
+            return base
+        return sorted(set(base) | extra)
+
+    def search(self, query: str, limit: int = MAX_RESULTS) -> list:
+        """Позиции строк, в столбцах поиска которых есть query, по порядку строк; не больше limit."""
+        query = normalize(query)
+        if not query:
+            return []
+        if len(query) < NGRAM:
+            # Короткий запрос - только по началу значения
+            found = set()
+            index = bisect.bisect_left(self.prefixes, (query,))
+            while index < len(self.prefixes) and self.prefixes[index][0].startswith(query):
+                value, row = self.prefixes[index]
+                if value in self.texts[row]:  # запись могла устареть после update
+                    found.add(row)
+                    if len(found) >= limit:
+                        break
+                index += 1
+            return sorted(found)
+
+        results = []
+        for row in self._candidates(query):
+            if any(query in value for value in self.texts[row]):
+                results.append(row)
+                if len(results) >= limit:
+                    break
+        return results
@@ -0,0 +1,93 @@
+import atexit
+import copy
+import json
+import os
+import threading
+from pathlib import Path
+
+from core.fileio import atomic_write_json
+
+SAVE_DELAY = 0.5  # секунд тишины перед записью на диск
+
+
+class SettingsStore:
+    """
+    Один JSON-файл настроек в памяти.
+    Чтение - из памяти (файл перечитывается, только если его изменили снаружи),
+    запись откладывается на SAVE_DELAY и идет атомарно через временный файл.
+    """
+
+    def __init__(self, filename):
+        self.path = Path(filename)
+        self.lock = threading.Lock()
+        self.data = None
+        self.mtime = None
+        self.timer = None
+        self.pending = False
+
+    def _file_mtime(self):
+        try:
+            return self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def load(self) -> dict:
+        """Копия настроек: изменения попадают в файл только через save."""
+        with self.lock:
+            mtime = self._file_mtime()
+            if self.data is None or (not self.pending and mtime != self.mtime):
+                if mtime is None:
+                    self.data = {}
+                else:
+                    with open(self.path, "r", encoding="utf-8") as f:
+                        self.data = json.load(f)
+                self.mtime = mtime
+            return copy.deepcopy(self.data)
+
+    def save(self, data: dict):
+        with self.lock:
+            self.data = copy.deepcopy(data)
+            self.pending = True
+            if self.timer:
+                self.timer.cancel()
+            self.timer = threading.Timer(SAVE_DELAY, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            if not self.pending:
+                return
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+            atomic_write_json(self.path, self.data)
+            self.mtime = self._file_mtime()
+            self.pending = False
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(filename) -> SettingsStore:
+    key = os.path.abspath(filename)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = SettingsStore(filename)
+        return _stores[key]
+
+
+def load_paths(filename) -> dict:
+    return get_store(filename).load()
+
+
+def save_paths(paths: dict, filename):
+    get_store(filename).save(paths)
+
+
+@atexit.register
+def flush_all():
+    """Отложенные записи не должны теряться при выходе из приложения."""
+    for store in list(_stores.values()):
+        store.flush()
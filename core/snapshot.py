@@ -0,0 +1,42 @@
+import hashlib
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from EI_protocols_utils.utils.settings import settings
+from core.fileio import atomic_write
+
+
+def snapshot_dir() -> Path:
+    """Снимки журналов лежат рядом с настройками приложения."""
+    return Path(settings.app_settings_path).parent / "cache"
+
+
+def snapshot_path(path) -> Path:
+    """Имя снимка: хэш пути + размер + mtime журнала - изменение файла дает новое имя."""
+    stat = os.stat(path)
+    path_hash = hashlib.sha1(str(Path(path).resolve()).encode("utf-8")).hexdigest()[:16]
+    return snapshot_dir() / f"{path_hash}_{stat.st_size}_{stat.st_mtime_ns}.pkl"
+
+
+def load_journal_frame(path) -> pd.DataFrame:
+    """
+    DataFrame журнала: из снимка, если журнал не менялся с прошлого чтения,
+    иначе читает xlsx и сохраняет новый снимок (старые снимки этого журнала удаляются).
+    """
+    cached = snapshot_path(path)
+    if cached.exists():
+        try:
+            return pd.read_pickle(cached)
+        except Exception:
+            cached.unlink(missing_ok=True)  # битый снимок - читаем журнал заново
+
+    df = pd.read_excel(path)
+
+    cached.parent.mkdir(parents=True, exist_ok=True)
+    prefix = cached.name.split("_", 1)[0]
+    for old in cached.parent.glob(f"{prefix}_*.pkl"):
+        old.unlink(missing_ok=True)
+    atomic_write(cached, df.to_pickle)
+    return df
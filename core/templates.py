@@ -0,0 +1,154 @@
+import hashlib
+import io
+import os
+import pickle
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+from pathlib import Path
+
+from openpyxl import load_workbook
+from openpyxl.worksheet.table import TableList
+
+from EI_protocols_utils.utils.settings import settings
+
+# "ЕИ-03-02-01180 Счетчик воды УВС-15Х №120252935 (47204-11).xlsm"
+_REGISTER_RE = re.compile(r"\(([^()]+)\)\s*\.\w+$")
+
+
+def _freeze(workbook) -> bytes:
+    """Разобранная книга в байты. Архив макросов и таблицы листов pickle сам не переносит."""
+    vba_archive = workbook.vba_archive
+    tables = {ws.title: ws._tables for ws in workbook.worksheets}
+    workbook.vba_archive = None
+    for ws in workbook.worksheets:
+        ws._tables = dict(ws._tables)
+    try:
+        return pickle.dumps(workbook, protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        workbook.vba_archive = vba_archive
+        for ws in workbook.worksheets:
+            ws._tables = tables[ws.title]
+
+
+def _thaw(frozen: bytes, raw: bytes):
+    workbook = pickle.loads(frozen)
+    for ws in workbook.worksheets:
+        ws._tables = TableList(ws._tables)
+    workbook.vba_archive = zipfile.ZipFile(io.BytesIO(raw))
+    return workbook
+
+
+class TemplateRegistry:
+    """
+    Шаблоны протоколов: индекс папки по рег. номеру строится один раз
+    (и обновляется при изменении папки), разобранные шаблоны живут в LRU-кэше
+    с ограничением по памяти и проверяются по mtime файла.
+    """
+
+    def __init__(self, templates_path, max_bytes: int = 64 * 1024 * 1024):
+        self.templates_path = Path(templates_path)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.index = {}  # рег. номер -> имена файлов
+        self.names = []
+        self.index_mtime = None
+        self.cache = OrderedDict()  # путь -> запись кэша
+        self.cache_bytes = 0
+        self.digests = {}  # путь -> (mtime, хэш содержимого)
+
+    def scan(self):
+        """Перестраивает индекс, только если содержимое папки изменилось."""
+        mtime = self.templates_path.stat().st_mtime_ns
+        if mtime == self.index_mtime:
+            return
+        index = {}
+        names = sorted(os.listdir(self.templates_path))
+        for fname in names:
+            match = _REGISTER_RE.search(fname)
+            if match:
+                index.setdefault(match.group(1).strip(), []).append(fname)
+        self.index, self.names, self.index_mtime = index, names, mtime
+
+    def find(self, register_number, name) -> Path:
+        """Шаблон, в имени которого есть и регистрационный номер, и наименование СИ."""
+        with self.lock:
+            self.scan()
+            register_number, name = str(register_number), str(name)
+            candidates = self.index.get(register_number.strip(), self.names)
+            for fname in candidates:
+                if register_number in fname and name in fname:
+                    return self.templates_path / fname
+        raise FileNotFoundError(f"Не найден шаблон для {name} ({register_number})")
+
+    def _entry(self, path) -> dict:
+        path = Path(path)
+        mtime = path.stat().st_mtime_ns
+        with self.lock:
+            entry = self.cache.get(path)
+            if entry and entry["mtime"] == mtime:
+                self.cache.move_to_end(path)
+                return entry
+        # Разбор шаблона - вне блокировки, он самый долгий
+        raw = path.read_bytes()
+        workbook = load_workbook(io.BytesIO(raw), keep_vba=True)
+        cells = {
+            wsheet.title: {
+                cell.coordinate: cell.value
+                for row in wsheet.iter_rows()
+                for cell in row
+                if cell.value is not None
+            }
+            for wsheet in workbook.worksheets
+        }
+        frozen = _freeze(workbook)
+        entry = {
+            "mtime": mtime,
+            "raw": raw,
+            "frozen": frozen,
+            "cells": cells,
+            "size": len(raw) + len(frozen) + 200 * sum(len(sheet) for sheet in cells.values()),
+        }
+        with self.lock:
+            old = self.cache.pop(path, None)
+            if old:
+                self.cache_bytes -= old["size"]
+            self.cache[path] = entry
+            self.cache_bytes += entry["size"]
+            # Вытесняем давно не использованные, но последний шаблон оставляем всегда
+            while self.cache_bytes > self.max_bytes and len(self.cache) > 1:
+                _, evicted = self.cache.popitem(last=False)
+                self.cache_bytes -= evicted["size"]
+        return entry
+
+    def cells(self, path) -> dict:
+        """Значения и формулы шаблона {лист: {координата: значение}}. Не изменять - это кэш."""
+        return self._entry(path)["cells"]
+
+    def workbook(self, path):
+        """Своя копия разобранного шаблона: изменения не затрагивают кэш."""
+        entry = self._entry(path)
+        return _thaw(entry["frozen"], entry["raw"])
+
+    def raw(self, path) -> bytes:
+        return self._entry(path)["raw"]
+
+    def digest(self, path) -> str:
+        """Хэш содержимого шаблона: меняется при любой правке файла. Шаблон для этого не разбирается."""
+        path = Path(path)
+        mtime = path.stat().st_mtime_ns
+        with self.lock:
+            cached = self.digests.get(path)
+            if cached and cached[0] == mtime:
+                return cached[1]
+        digest = hashlib.sha1(path.read_bytes()).hexdigest()
+        with self.lock:
+            self.digests[path] = (mtime, digest)
+        return digest
+
+
+template_registry = TemplateRegistry(
+    settings.water_meter_templates_path,
+    max_bytes=int(getattr(settings, "template_cache_mb", 64)) * 1024 * 1024,
+)
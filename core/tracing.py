@@ -0,0 +1,100 @@
+import json
+import math
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Порядок стадий в сводке
+STAGES = ("read", "dry-run", "validate", "weather", "reread", "render", "write-back", "save")
+
+
+def percentile(sorted_values: list, share: float) -> float:
+    """Перцентиль методом ближайшего ранга по отсортированному списку."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(share * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Tracer:
+    """
+    Спаны стадий по строкам журнала. Копятся в памяти, на диск выгружаются
+    один раз в конце прогона: трасса JSON-lines и сводная таблица p50/p95.
+    С enabled=False спаны ничего не записывают.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        self.spans = []
+
+    def add(self, stage: str, row, seconds: float, start: float = None, **attrs):
+        if not self.enabled:
+            return
+        span = {
+            "stage": stage,
+            "row": row,
+            "start": round((start if start is not None else time.perf_counter() - seconds) - self.origin, 6),
+            "seconds": round(seconds, 6),
+        }
+        span.update(attrs)
+        self.spans.append(span)
+
+    @contextmanager
+    def span(self, stage: str, row=None, **attrs):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, row, time.perf_counter() - start, start=start, **attrs)
+
+    def iter(self, stage: str, iterable, first_row: int):
+        """Отдает элементы iterable, записывая время получения каждого как спан строки."""
+        iterator = iter(iterable)
+        row = first_row
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.add(stage, row, time.perf_counter() - start, start=start)
+            yield item
+            row += 1
+
+    def summary(self) -> dict:
+        """{стадия: {"count", "total", "p50", "p95", "max"}}, время в секундах."""
+        durations = {}
+        for span in self.spans:
+            durations.setdefault(span["stage"], []).append(span["seconds"])
+        order = [stage for stage in STAGES if stage in durations] + sorted(set(durations) - set(STAGES))
+        result = {}
+        for stage in order:
+            values = sorted(durations[stage])
+            result[stage] = {
+                "count": len(values),
+                "total": sum(values),
+                "p50": percentile(values, 0.5),
+                "p95": percentile(values, 0.95),
+                "max": values[-1],
+            }
+        return result
+
+    def summary_table(self) -> str:
+        lines = [f"{'Стадия':<12}{'N':>6}{'p50, мс':>10}{'p95, мс':>10}{'макс, мс':>10}{'всего, с':>10}"]
+        for stage, stats in self.summary().items():
+            lines.append(
+                f"{stage:<12}{stats['count']:>6}{stats['p50'] * 1000:>10.1f}{stats['p95'] * 1000:>10.1f}"
+                f"{stats['max'] * 1000:>10.1f}{stats['total']:>10.2f}"
+            )
+        return "\n".join(lines)
+
+    def export(self, path) -> Path:
+        """Пишет трассу (по спану в строке) и рядом сводку .summary.txt."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for span in self.spans:
+                f.write(json.dumps(span, ensure_ascii=False) + "\n")
+        path.with_name(path.stem + ".summary.txt").write_text(self.summary_table() + "\n", encoding="utf-8")
+        return path
@@ -0,0 +1,99 @@
+import json
+import random
+from datetime import date, datetime
+from pathlib import Path
+
+from EI_protocols_utils.utils.settings import settings
+from core.fileio import atomic_write_json
+
+DATE_FORMAT = "%d.%m.%Y"
+
+
+def parse_date(value) -> date:
+    """'17.10.2025', datetime или date -> date."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value).strip(), DATE_FORMAT).date()
+
+
+class WeatherStore:
+    """
+    Журнал погоды в памяти: файл читается один раз за запуск,
+    поиск идет по словарю с ключом-датой, новые записи копятся
+    и сохраняются одним атомарным сохранением в конце пакета.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.records = None  # date -> {"temperature": ..., "pressure": ..., "humidity": ...}
+        self.mtime = None
+        self.dirty = False
+
+    def load(self):
+        """Читает файл, если он еще не прочитан или изменен снаружи (и у нас нет несохраненных записей)."""
+        mtime = self.path.stat().st_mtime if self.path.exists() else None
+        if self.records is not None and (self.dirty or mtime == self.mtime):
+            return
+        records = {}
+        if mtime is not None:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for date_str, weather in json.load(f).items():
+                    try:
+                        records[parse_date(date_str)] = weather
+                    except ValueError:
+                        continue  # запись с неразборчивой датой пропускаем
+        self.records = records
+        self.mtime = mtime
+
+    def get(self, day) -> dict:
+        self.load()
+        return self.records.get(parse_date(day))
+
+    def add(self, day, temperature: str, pressure: str, humidity: str):
+        self.load()
+        self.records[parse_date(day)] = {
+            "temperature": str(temperature),
+            "pressure": str(pressure),
+            "humidity": str(humidity),
+        }
+        self.dirty = True
+
+    def generate(self, day) -> dict:
+        """Случайная погода в пределах из настроек; сразу запоминается в журнале."""
+        temperature = str(round(random.uniform(settings.temperatures["min"], settings.temperatures["max"]), 1))
+        pressure = str(round(random.uniform(settings.pressure["min"], settings.pressure["max"]), 1))
+        humidity = str(round(random.uniform(settings.humdity["min"], settings.humdity["max"]), 1))
+        self.add(day, temperature, pressure, humidity)
+        return self.records[parse_date(day)]
+
+    def fill_record(self, record):
+        """Заполняет погоду записи журнала из журнала погоды или генерирует новую."""
+        if not record.temperature or not record.pressure or not record.humidity:
+            weather = self.get(record.date) or self.generate(record.date)
+            record.temperature = weather["temperature"] + ' °C'
+            record.pressure = weather["pressure"] + ' кП'
+            record.humidity = weather["humidity"] + ' %'
+        return record
+
+    def fill_records(self, records: list) -> list:
+        """Заполняет погоду сразу для пачки записей: каждая дата ищется или генерируется один раз."""
+        for record in records:
+            self.fill_record(record)
+        return records
+
+    def flush(self):
+        """Атомарно сохраняет журнал погоды, если были новые записи."""
+        if not self.dirty:
+            return
+        data = {
+            day.strftime(DATE_FORMAT): weather
+            for day, weather in self.records.items()
+        }
+        atomic_write_json(self.path, data, fsync=True)
+        self.mtime = self.path.stat().st_mtime
+        self.dirty = False
+
+
+weather_store = WeatherStore(settings.weather_journal_path)
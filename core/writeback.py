@@ -0,0 +1,94 @@
+import json
+import os
+import time
+from pathlib import Path
+
+from openpyxl import load_workbook
+
+from EI_protocols_utils.utils.constants import JOURNAL_WORKSHEET
+from core.fileio import atomic_write
+from core.tracing import Tracer
+
+
+class JournalWriter:
+    """
+    Копит изменения ячеек журнала и сохраняет книгу пачками:
+    каждые flush_rows строк, раз в flush_seconds секунд и в конце работы.
+    Каждое изменение сначала дописывается в журнал изменений рядом с журналом,
+    чтобы при падении приложения между сохранениями ничего не потерялось;
+    подхватывает его recover() - вызывается там, где можно открыть и сохранить книгу
+    (в окне - в рабочем потоке прогона).
+    """
+
+    def __init__(self, journal_path, flush_rows: int = 50, flush_seconds: float = 30.0, tracer: Tracer = None):
+        # Книга открывается только при первом сохранении - чтение идет потоком мимо нее
+        self.workbook = None
+        self.wsheet = None
+        self.journal_path = journal_path
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.tracer = tracer or Tracer(enabled=False)
+        self.log_path = Path(f"{journal_path}.pending.jsonl")
+
+        self.pending = {}  # номер строки -> {номер столбца: значение}
+        self.last_flush = time.monotonic()
+        self.recovered = 0  # строк, подхваченных из журнала изменений прошлого раза
+
+    def recover(self) -> int:
+        """Подхватывает изменения, не сохраненные в прошлый раз, и сохраняет книгу. Возвращает число строк."""
+        if not self.log_path.exists():
+            return 0
+        with open(self.log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # недописанная последняя строка при падении
+                cells = {int(col): value for col, value in record["cells"].items()}
+                self.pending.setdefault(record["row"], {}).update(cells)
+        self.recovered = len(self.pending)
+        self.flush()
+        return self.recovered
+
+    def update_row(self, row_number: int, changes: dict):
+        """Запоминает измененные ячейки строки (ключи - индексы столбцов с 0)."""
+        if not changes:
+            return
+        with self.tracer.span("write-back", row_number):
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"row": row_number, "cells": changes}, ensure_ascii=False, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.pending.setdefault(row_number, {}).update(changes)
+        # Сохранение книги - отдельная стадия "save"
+        self.maybe_flush()
+
+    def maybe_flush(self):
+        if len(self.pending) >= self.flush_rows or time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """Переносит накопленные изменения в книгу и сохраняет ее один раз."""
+        if self.pending:
+            with self.tracer.span("save", rows=len(self.pending)):
+                if self.workbook is None:
+                    self.workbook = load_workbook(filename=self.journal_path)
+                    self.wsheet = self.workbook[JOURNAL_WORKSHEET]
+                for row_number in sorted(self.pending):
+                    for col, value in self.pending[row_number].items():
+                        self.wsheet.cell(row=row_number, column=col + 1).value = value
+                # Через временный файл: падение посреди сохранения не испортит журнал
+                atomic_write(self.journal_path, self.workbook.save, fsync=True)
+            self.pending.clear()
+        # Книга подменена целиком - журнал изменений больше не нужен
+        if self.log_path.exists():
+            self.log_path.unlink()
+        self.last_flush = time.monotonic()
+
+    def discard(self):
+        """Отменяет несохраненные изменения: книга не трогается, журнал изменений удаляется."""
+        self.pending.clear()
+        self.log_path.unlink(missing_ok=True)
+
+    def close(self):
+        self.flush()
@@ -1,201 +1,377 @@
 
+"""
+Создание протоколов без окна - для запуска по расписанию.
+
+    python main.py --rows 2-500 700 710-720 --workers 4
+    python main.py --journal journal.xlsx --output protocols --rows 2-100 --on-error rollback
+    python main.py --job "Журнал Стариков.xlsx=2-300" --job "Журнал Иванов.xlsx=2-150,200" --workers 0
+
+По строке JSON на каждую строку журнала в stdout, сообщения - в stderr.
+Коды выхода: 0 - все строки готовы, 1 - есть строки с ошибками (готовые сохранены),
+2 - неверные аргументы, 3 - были ошибки и журнал с ними откатан (--on-error rollback),
+4 - прогон не состоялся (нет журнала, папки и т.п.), 130 - прерван.
+"""
+import argparse
+import json
+import sys
+import time
 from pathlib import Path
-from openpyxl import load_workbook
 import re
-import random
 import os
 
-from EI_protocols_utils.utils.models import ExcelProtocol, WaterMeterProtocol
 from EI_protocols_utils.utils.settings import settings
-from EI_protocols_utils.utils.constants import *
 from EI_protocols_utils.utils.exchanges import RequiredFieldsError, RowError
-from EI_protocols_utils.utils.weather import get_weather, add_weather
-from EI_protocols_utils.utils.user_info import save_paths, load_paths
+from core.backends import get_backend
+from core.catalog import protocol_catalog
+from core.journal_reader import JournalReader
+from core.measurements import flow_range_text
+from core.output_cache import final_kwargs, protocol_key
+from core.records import JOURNAL_FIELDS, JournalRecord, field_titles
+from core.render import render_protocols
+from core.scheduler import cost_model, schedule_jobs
+from core.settings_store import load_paths
+from core.templates import template_registry
+from core.weather import weather_store
+from core.writeback import JournalWriter
 
 class Journal:
-    required_fields = [0, 2, 5, 7, 9, 10, 12, 13, 21, 32, 35, 44, 45]
+    required_fields = ["protocol_id", "register_number", "name", "serial", "date", "next_date", "si_numbers",
+                       "result", "method", "address", "verifier", "year", "readings"]
     
-    def __init__(self, path: Path):
+    def __init__(self, path: Path, transactional: bool = False):
         self.path = path
-        self.workbook = load_workbook(filename=self.path)
-        self.wsheet = self.workbook[JOURNAL_WORKSHEET]
+        # Журнал читается потоком, целиком книга открывается только для сохранения
+        self.reader = JournalReader(self.path)
+        self.titles = field_titles(self.reader.header())
+        # transactional: книга не сохраняется до commit(), чтобы прогон можно было откатить
+        self.writer = JournalWriter(
+            self.path,
+            flush_rows=float("inf") if transactional else getattr(settings, "journal_flush_rows", 50),
+            flush_seconds=float("inf") if transactional else getattr(settings, "journal_flush_seconds", 30),
+        )
+        self.writer.recover()
         
-    def validate_row(self, row: list) -> list:
+    def validate_row(self, record: JournalRecord) -> JournalRecord:
         # Выводим пропущенные обязательные поля
-        missing_fields = []
-        for index in self.required_fields:
-            if not row[index]:
-                missing_fields.append(index)
-        
-        cells_names = {}
-        first_row = self.wsheet[1] # Нумерация в openpyxl с 1
-        for index in self.required_fields:
-            field_name = first_row[index].value
-            cells_names[index] = field_name
+        missing_fields = [field for field in self.required_fields if not getattr(record, field)]
         
         if missing_fields:
             # Получаем названия пропущенных полей
-            missing_field_names = [cells_names[index] for index in missing_fields]
+            missing_field_names = [self.titles[field] for field in missing_fields]
             # Формируем человекочитаемую строку
             missing_field_list = ", ".join(missing_field_names)
-            raise RequiredFieldsError(f"Пропущены поля: {missing_field_list}", missing_fields)
+            raise RequiredFieldsError(f"Пропущены поля: {missing_field_list}",
+                                      [JOURNAL_FIELDS[field] for field in missing_fields])
 
-        row[1] = '1' if not row[1] else str(row[1])
+        record.copies = '1' if not record.copies else str(record.copies)
         
-        # Если не указана погода, то создаем или берем из журнала погоды
-        if not row[14] or not row[15] or not row[16]:
-            date_str = row[9].strftime("%d.%m.%Y") if type(row[9]) is not str else row[9]
-            weather = get_weather(date_str)
-            if weather and (not row[14] or not row[15] or not row[16]):
-                row[14] = weather["temperature"] + ' °C'
-                row[15] = weather["pressure"] + ' кП'
-                row[16] = weather["humidity"] + ' %'
-                if not get_weather(date_str):
-                    add_weather(date_str, row[14], row[15], row[16])  # Обновляем журнал погоды
-            else:
-                # Если погоды нет, то генерируем случайные значения и сохраняем в журнал погоды
-                temperature = str(round(random.uniform(settings.temperatures["min"], settings.temperatures["max"]), 1))
-                pressure = str(round(random.uniform(settings.pressure["min"], settings.pressure["max"]), 1))
-                humidity = str(round(random.uniform(settings.humdity["min"], settings.humdity["max"]), 1))
-                add_weather(date_str, temperature, pressure, humidity)
-                row[14] = temperature + ' °C'
-                row[15] = pressure + ' кП'
-                row[16] = humidity + ' %'
-
-        row[34] = '1' if not row[34] else str(row[34])
+        # Если не указана погода, то берем из журнала погоды или генерируем
+        weather_store.fill_record(record)
+
+        record.sheets = '1' if not record.sheets else str(record.sheets)
         
         
         #
         #   ДОДЕЛАТЬ, БРАТЬ ИЗ ГОТОВОГО ПРОТОКОЛА
         #
-        # if not row[41]:
-        #     row[41] = f"Поверен в диапазоне расхода (0,03-{round(random.uniform(settings.flow_ranges['min'], settings.flow_ranges['max']), 1)}) м3/ч"
+        # if not record.flow_range:
+        #     record.flow_range = f"Поверен в диапазоне расхода (0,03-{round(random.uniform(settings.flow_ranges['min'], settings.flow_ranges['max']), 1)}) м3/ч"
 
-        if not row[47]: row[47] = "Частное лицо"
+        if not record.owner: record.owner = "Частное лицо"
 
-        return row
+        return record
+        
+    def prepare_row(self, record: JournalRecord, to_folder: str) -> dict:
+        """Проверяет строку и собирает параметры протокола."""
+        # Проверяем и дополняем данные
+        self.validate_row(record)
         
-    def create_protocols(self, from_row: int, to_row: int, to_folder: str) -> list[str]:
-        errors = []
-        completed = []
-        not_completed = []
-        for index, row in enumerate(self.wsheet.iter_rows(min_row=from_row, max_row=to_row, values_only=False)):
+        temperature_str = re.sub(r"[^0-9.]", "", str(record.temperature).replace(',', '.'))
+        pressure_str = re.sub(r"[^0-9.]", "", str(record.pressure).replace(',', '.'))
+        humidity_str = re.sub(r"[^0-9.]", "", str(record.humidity).replace(',', '.'))
+        readings_str = re.sub(r"[^0-9.]", "", str(record.readings).replace(',', '.'))
+        
+        temperature_float = round(float(temperature_str), 1)
+        pressure_float = round(float(pressure_str), 1)
+        humidity_float = round(float(humidity_str), 1)
+        readings_float = round(float(readings_str), 3)
+        
+        # Параметры протокола (словарь, чтобы передать его в процесс пула)
+        return dict(
+            dir_path=to_folder,
+            tab_number=settings.tab_numbers.get(record.verifier, record.protocol_id.split('-')[2]),
+            protocol_number=record.protocol_id.split('-')[-1],
+            date=record.date.strftime("%d.%m.%Y") if type(record.date) is not str else record.date,
+            next_date=record.next_date.strftime("%d.%m.%Y") if type(record.next_date) is not str else record.next_date,
+            SI_numbers=record.si_numbers,
+            suitability=False if record.result=="Непригодно" else True,
+            reasons_for_unsuitability=record.reasons,
+            name=record.name,
+            number=record.serial,
+            register_number=record.register_number,
+            year=int(record.year),
+            owner=record.owner if record.owner else "Частное лицо",
+            address=record.address,
+            temperature=temperature_float,
+            pressure=pressure_float,
+            humidity=humidity_float,
+            readings=readings_float,
+            unit_type=record.unit_type
+        )
+
+    def prepare_jobs(self, row_numbers: list, to_folder: str, on_result=None) -> list:
+        """
+        Проверяет строки row_numbers и возвращает задания (номер строки, параметры протокола).
+        on_result(номер строки, результат, ошибка) вызывается для каждой строки по мере готовности,
+        результат - (xlsx, pdf). Итоги прогона собирает results().
+        """
+        self.completed = []
+        self.errors = []
+        self.not_completed = []
+        self.records = {}
+        self.on_result = on_result or (lambda row_number, result, error: None)
+
+        # Проверяем строки здесь, в пул уходят только готовые параметры протоколов
+        wanted = set(row_numbers)
+        jobs = []
+        for record in self.reader.iter_records(min(wanted), max(wanted)):
+            if record.row_number not in wanted:
+                continue
+            # Строки за концом листа читатель отдает пустыми - это не "пропущены поля", а нет строки
+            if self.reader.last_row is not None and record.row_number > self.reader.last_row:
+                self.row_failed(IndexError("строки нет в журнале"), record.row_number)
+                continue
             try:
-                # Преобразуем к значениям для работы
-                values = [cell.value for cell in row]
-
-                # for index, value in enumerate(values):
-                #     print(f"{index}: {value}")
-
-                # Проверяем и дополняем данные
-                self.validate_row(values)
-                
-                
-                
-                temperature_str = re.sub(r"[^0-9.]", "", str(values[14]).replace(',', '.'))
-                pressure_str = re.sub(r"[^0-9.]", "", str(values[15]).replace(',', '.'))
-                humidity_str = re.sub(r"[^0-9.]", "", str(values[16]).replace(',', '.'))
-                readings_str = re.sub(r"[^0-9.]", "", str(values[45]).replace(',', '.'))
-                
-                temperature_float = round(float(temperature_str), 1)
-                pressure_float = round(float(pressure_str), 1)
-                humidity_float = round(float(humidity_str), 1)
-                readings_float = round(float(readings_str), 3)
-                
-                # Создаем протокол
-                protocol = WaterMeterProtocol(
-                    dir_path=to_folder,
-                    tab_number=settings.tab_numbers.get(values[35], values[0].split('-')[2]),
-                    protocol_number=values[0].split('-')[-1],
-                    date=values[9].strftime("%d.%m.%Y") if type(values[9]) is not str else values[9],
-                    next_date=values[10].strftime("%d.%m.%Y") if type(values[10]) is not str else values[10],
-                    SI_numbers=values[12],
-                    suitability=False if values[13]=="Непригодно" else True,
-                    reasons_for_unsuitability=values[38],
-                    name=values[5],
-                    number=values[7],
-                    register_number=values[2],
-                    year=int(values[44]),
-                    owner=values[47] if values[47] else "Частное лицо",
-                    address=values[32],
-                    temperature=temperature_float,
-                    pressure=pressure_float,
-                    humidity=humidity_float,
-                    readings=readings_float,
-                    unit_type=values[48]
-                )
-                
-                xlsx_path, pdf_path = protocol.create()
-                completed.append((xlsx_path, pdf_path))
-                print(f"Создан протокол: {xlsx_path}")
-                
-                ready_protocol = load_workbook(filename=xlsx_path, data_only=True) # Без data_only=False будут формулы
-                ready_wsheet = ready_protocol[WATER_METER_PROTOTOCOL_SEETNAME]
-                
-                if "Измерения на расходе Qнаиб , л/ч" in str(ready_wsheet["B55"].value):
-                    consumption=max(float(ready_wsheet["AC55"].value), float(ready_wsheet["AC54"].value), float(ready_wsheet["AC53"].value))
-                elif "Измерения на расходе Qнаиб , л/ч" in ready_wsheet["B59"].value:
-                    consumption=max(float(ready_wsheet["AC61"].value), float(ready_wsheet["AC60"].value), float(ready_wsheet["AC59"].value))
-                else:
-                    raise Exception("Не удалось определить максимальный расход из протокола"\
-                        "Убедитесь, что шаблон протокола содержит результаты расхода измерений в B53-B55, или AC59-AC61")
-                    
-                values[41] = f"Поверен в диапазоне расхода (0,03-{round(consumption, 3)}) м3/ч"
-                for i, cell in enumerate(row):
-                    cell.value = values[i]
-                    
+                jobs.append((record.row_number, self.prepare_row(record, to_folder)))
+                self.records[record.row_number] = record
             except Exception as e:
-                errors.append(RowError(e, index+from_row))
-                not_completed.append(index+from_row)
-                #raise e
-            except RequiredFieldsError as rfe:
-                not_completed.append(index+from_row)
-                errors.append(RowError(rfe, index+from_row))
-
-        print(f"Выполнены успешно ({len(completed)}): ")
-        for item in completed:
-            print(f" - {item[0].name}, {item[1].name}")
-        print(f"\nС ошибками ({len(errors)}): ")
-        for error in errors:
-            print(f" - {error}, строка {error.row_number}")
-            
-        if errors:
-            if input("\nСохранить протоколы? (y/n): ").lower() == 'n':
-                for item in completed:
-                    print(f"Удаляем протоколы: {item[0].name}, {item[1].name}")
-                    os.remove(item[0])
-                    os.remove(item[1])
-                    
-        self.workbook.save(filename=self.path)
-
-journal = Journal(path=Path("data/journal.xlsx").resolve())
-
-data = load_paths(filename=settings.user_info_path)
-journal_path=data.get('journal_path')
-protocols_path=data.get('protocols_path')
-
-if not journal_path: 
-    journal_path = input(f"Введите путь до журнала:")
-    data['journal_path'] = journal_path
-    
-else:
-    question = input(f"Использовать этот журнал: {journal_path}? Enter если хотите использовать, если нет то введите нужный путь:")
-    if question: 
-        journal_path=question
-        data['journal_path'] = journal_path
-
-if not protocols_path: 
-    protocols_path = input(f"Введите путь до папки к готовым протоколам:")
-    data['protocols_path'] = protocols_path
-else:
-    question = input(f"Использовать этот путь: {protocols_path}? Enter если хотите использовать, если нет то введите нужный путь:")
-    if question: 
-        protocols_path=question
-        data['protocols_path'] = protocols_path
-
-save_paths(paths=data, filename=settings.user_info_path)
-
-from_row = int(input(f"С какой строки начать:"))
-to_row = int(input(f"На какой закончить:"))
-
-journal.create_protocols(from_row=from_row, to_row=to_row, to_folder=protocols_path)
\ No newline at end of file
+                self.row_failed(e, record.row_number)
+        return jobs
+
+    def row_failed(self, e, row_number: int):
+        self.errors.append(RowError(e, row_number))
+        self.not_completed.append(row_number)
+        self.on_result(row_number, None, e)
+
+    def apply_result(self, row_number: int, result: tuple, error: Exception) -> bool:
+        """Результат render_protocol для строки: изменения строки уходят в журнал. False - строка с ошибкой."""
+        record = self.records[row_number]
+        try:
+            if error:
+                raise error
+            xlsx_path, pdf_path, _, measurements = result
+            self.completed.append((xlsx_path, pdf_path))
+
+            if measurements:
+                record.flow_range = flow_range_text(measurements["max_flow"])
+            self.writer.update_row(row_number, record.changes())
+            self.on_result(row_number, (xlsx_path, pdf_path), None)
+            return True
+
+        except Exception as e:
+            self.row_failed(e, row_number)
+            return False
+
+    def results(self) -> tuple:
+        """(готовые протоколы, ошибки, номера строк с ошибками) - ошибки по порядку строк."""
+        # Пул возвращает строки в порядке готовности
+        self.errors.sort(key=lambda error: error.row_number)
+        self.not_completed.sort()
+        return self.completed, self.errors, self.not_completed
+
+    def create_protocols(self, row_numbers: list, to_folder: str, workers: int = 1, on_result=None) -> tuple:
+        """
+        Создает протоколы для строк журнала row_numbers, см. prepare_jobs и results.
+        Журнал не сохраняется окончательно до commit() - или rollback(), если прогон нужно отменить.
+        """
+        return run_batch([(self, row_numbers, on_result)], to_folder, workers)[0]
+
+    def commit(self):
+        """Сохраняет изменения журнала."""
+        self.writer.close()
+
+    def rollback(self, completed: list):
+        """Удаляет созданные протоколы и отменяет изменения журнала."""
+        for paths in completed:
+            for path in paths:
+                Path(path).unlink(missing_ok=True)
+            protocol_catalog.remove_files(paths)
+        self.writer.discard()
+
+
+def run_batch(batch: list, to_folder: str, workers: int = 1) -> list:
+    """
+    Несколько журналов за один проход: batch - [(журнал, номера строк, on_result)].
+    Задания всех журналов идут в один пул процессов (общий лимит workers), по шаблонам -
+    так разобранный шаблон используется строками всех журналов. Погода общая.
+    В каждый журнал пишет только его Journal, и только из этого потока.
+    Возвращает results() каждого журнала в порядке batch.
+    """
+    jobs = []
+    template_of = {}  # (номер журнала в batch, номер строки) -> имя шаблона
+    digests = {}      # (номер журнала в batch, номер строки) -> хэш шаблона
+    for index, (journal, row_numbers, on_result) in enumerate(batch):
+        for row_number, protocol_kwargs in journal.prepare_jobs(row_numbers, to_folder, on_result):
+            try:
+                template = template_registry.find(protocol_kwargs["register_number"], protocol_kwargs["name"])
+            except FileNotFoundError as e:
+                journal.row_failed(e, row_number)
+                continue
+            template_of[(index, row_number)] = template.name
+            digests[(index, row_number)] = template_registry.digest(template)
+            jobs.append(((index, row_number), protocol_kwargs))
+
+    # Новая погода за весь пакет сохраняется одним разом
+    weather_store.flush()
+
+    jobs = schedule_jobs(jobs, template_of, cost_model, workers)
+    job_kwargs = dict(jobs)
+    backend = get_backend().name
+    for job, result, error in render_protocols(jobs, workers):
+        journal = batch[job[0]][0]
+        if result:
+            cost_model.add(template_of[job], result[2])
+        if journal.apply_result(job[1], result, error):
+            xlsx_path, pdf_path, _, measurements = result
+            protocol_kwargs = final_kwargs(job_kwargs[job], measurements)
+            protocol_catalog.add(protocol_kwargs, xlsx_path, pdf_path,
+                                 protocol_key(protocol_kwargs, digests[job], backend), journal.path, job[1])
+    cost_model.save()
+    return [journal.results() for journal, _, _ in batch]
+
+
+def parse_rows(specs: list) -> list:
+    """["2-10", "15", "20-22"] -> [2, ..., 10, 15, 20, 21, 22]. Строка 1 - заголовок."""
+    rows = set()
+    for spec in specs:
+        for part in spec.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            first, _, last = part.partition("-")
+            try:
+                first, last = int(first), int(last or first)
+            except ValueError:
+                raise argparse.ArgumentTypeError(f"не номер строки и не диапазон: {part!r}")
+            if first < 2 or last < first:
+                raise argparse.ArgumentTypeError(f"неверный диапазон строк: {part!r}")
+            rows.update(range(first, last + 1))
+    return sorted(rows)
+
+
+def parse_job(spec: str) -> tuple:
+    """"Журнал Стариков.xlsx=2-100,150" -> (путь, номера строк)."""
+    path, sep, rows = spec.rpartition("=")
+    if not sep or not path:
+        raise argparse.ArgumentTypeError(f"нужно ПУТЬ=СТРОКИ: {spec!r}")
+    return path, parse_rows([rows])
+
+
+def emit(record: dict):
+    """Строка JSON в stdout - сразу, чтобы ее видел тот, кто читает вывод по ходу прогона."""
+    print(json.dumps(record, ensure_ascii=False, default=str), flush=True)
+
+
+def main(argv=None) -> int:
+    data = load_paths(filename=settings.user_info_path)
+
+    parser = argparse.ArgumentParser(description="Создание протоколов по строкам журналов без окна")
+    parser.add_argument("--journal", default=data.get("journal_path"),
+                        help="журнал .xlsx для --rows (по умолчанию - последний открытый в приложении)")
+    parser.add_argument("--rows", nargs="+",
+                        help="строки журнала: номера и диапазоны, например 2-100 150 200-210")
+    parser.add_argument("--job", action="append", default=[], metavar="ЖУРНАЛ=СТРОКИ",
+                        help="еще журнал со строками, например \"Журнал Стариков.xlsx=2-100,150\"; можно повторять")
+    parser.add_argument("--output", default=data.get("protocols_path"),
+                        help="папка для протоколов (по умолчанию - из приложения)")
+    parser.add_argument("--workers", type=int, default=getattr(settings, "protocol_workers", 1),
+                        help="процессов для создания протоколов на все журналы, 0 - по числу ядер")
+    parser.add_argument("--on-error", choices=("keep", "rollback"), default="keep",
+                        help="keep - сохранить готовое; rollback - при ошибке в журнале удалить его протоколы и не менять его")
+    args = parser.parse_args(argv)
+
+    if not args.output:
+        parser.error("не указана папка протоколов (--output)")
+    # Строки по журналам; один и тот же журнал из разных --job сливается в одно задание
+    wanted = {}
+    try:
+        specs = [parse_job(spec) for spec in args.job]
+        if args.rows:
+            if not args.journal:
+                parser.error("не указан журнал (--journal)")
+            specs.insert(0, (args.journal, parse_rows(args.rows)))
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    if not specs:
+        parser.error("не заданы строки: --rows или --job")
+    for path, row_numbers in specs:
+        wanted.setdefault(Path(path).resolve(), set()).update(row_numbers)
+    workers = args.workers if args.workers > 0 else os.cpu_count() or 1
+
+    log = lambda text: print(text, file=sys.stderr, flush=True)
+    start = time.perf_counter()
+    try:
+        os.makedirs(args.output, exist_ok=True)
+        journals = [Journal(path=path, transactional=args.on_error == "rollback") for path in wanted]
+    except Exception as e:
+        log(f"Прогон не начат: {e}")
+        return 4
+
+    created = {journal.path: [] for journal in journals}  # протоколы прогона - для отката, даже если прогон прерван
+
+    def on_result(journal):
+        def callback(row_number, result, error):
+            record = {"journal": journal.path, "row": row_number}
+            if result:
+                created[journal.path].append(result)
+                record.update(status="ok", xlsx=result[0], pdf=result[1])
+            else:
+                record.update(status="error", error=str(error), type=type(error).__name__)
+            emit(record)
+        return callback
+
+    for journal in journals:
+        log(f"Журнал {journal.path}: строк {len(wanted[journal.path])}")
+    log(f"Процессов: {workers}")
+    batch = [(journal, sorted(wanted[journal.path]), on_result(journal)) for journal in journals]
+    try:
+        results = run_batch(batch, args.output, workers)
+    except KeyboardInterrupt:
+        # Готовые строки уже в журналах изменений - сохраняем их, если откат не требуется
+        for journal in journals:
+            if args.on_error == "rollback":
+                journal.rollback(created[journal.path])
+            else:
+                journal.commit()
+        log("Прервано")
+        return 130
+
+    summary = {"journals": [], "completed": 0, "errors": 0, "rolled_back": 0}
+    for journal, (completed, errors, _) in zip(journals, results):
+        rolled_back = bool(errors) and args.on_error == "rollback"
+        if rolled_back:
+            journal.rollback(completed)
+            log(f"{journal.path}: ошибок {len(errors)} - протоколы удалены, журнал не изменен")
+        else:
+            journal.commit()
+        summary["journals"].append({
+            "journal": journal.path,
+            "rows": len(wanted[journal.path]),
+            "completed": len(completed),
+            "errors": len(errors),
+            "rolled_back": rolled_back,
+        })
+        summary["completed"] += len(completed)
+        summary["errors"] += len(errors)
+        summary["rolled_back"] += rolled_back
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    emit({"summary": summary})
+
+    if summary["rolled_back"]:
+        return 3
+    return 1 if summary["errors"] else 0
+
+
+# Защита нужна для пула процессов: дочерние процессы импортируют этот модуль заново
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip("EI_protocols_utils")
+
+from core.catalog import ProtocolCatalog, parse_name
+
+
+def test_parse_name_with_mark_before_meter():
+    fields = parse_name("ЕИ-03-02-01320 ОПТ Счетчик воды УВС-15Х №120252935 (47204-11).xlsx")
+    assert fields == {
+        "protocol_number": "01320",
+        "tab_number": "02",
+        "serial": "120252935",
+        "register_number": "47204-11",
+        "name": "УВС-15Х",
+    }
+
+
+def test_add_files_keeps_names_out_of_form(tmp_path):
+    catalog = ProtocolCatalog(tmp_path / "catalog.sqlite3")
+    folder = tmp_path / "protocols"
+    folder.mkdir()
+    names = [
+        "ЕИ-03-02-01320 ОПТ Счетчик воды УВС-15Х №120252935 (47204-11).xlsx",
+        "ЕИ-03-02-01320 ОПТ Счетчик воды УВС-15Х №120252935 (47204-11).pdf",
+        "Счетчик №555 исправленный.xlsx",
+    ]
+    for name in names:
+        (folder / name).write_bytes(b"")
+
+    assert catalog.rebuild(folder) == 2
+    assert catalog.files(folder) == {str(folder / name) for name in names}
+    assert [row["xlsx"] for row in catalog.find(serial="120252935")] == [str(folder / names[0])]
+    assert catalog.duplicates() == []
+    catalog.close()
+
+
+def test_rebuild_marks_folder_indexed(tmp_path):
+    catalog = ProtocolCatalog(tmp_path / "catalog.sqlite3")
+    folder = tmp_path / "protocols"
+    folder.mkdir()
+    catalog.add_files([folder / "ЕИ-03-02-00001 Счетчик воды УВС-15Х №1 (47204-11).xlsx"])
+
+    assert not catalog.is_indexed(folder)
+    catalog.rebuild(folder)
+    assert catalog.is_indexed(folder)
+    catalog.close()
@@ -0,0 +1,32 @@
+from core.row_colors import GREEN, RowColorEngine, name_substrings
+
+
+NAME = "ЕИ-03-02-01180 Счетчик воды УВС-15Х №A1234 (47204-11).xlsx"
+
+
+def test_serial_is_found_as_substring_of_file_name():
+    engine = RowColorEngine([f"/protocols/2025-10/{NAME}"])
+    assert engine.has_protocol("A1234")
+    assert engine.has_protocol("1234")    # часть слова
+    assert engine.has_protocol("УВС-15Х №A1")  # через разделители
+    assert not engine.has_protocol("12345")
+    assert not engine.has_protocol("2025")  # папки не в счет
+    assert not engine.has_protocol(None)
+
+
+def test_removed_file_no_longer_counts():
+    engine = RowColorEngine([NAME])
+    assert engine.has_protocol("1234")
+    engine.remove_files([NAME])
+    assert not engine.has_protocol("1234")
+
+
+def test_name_substrings_cover_serials():
+    assert {"1234", "A1234", "01180"} <= name_substrings(NAME)
+
+
+def test_compute_marks_rows_with_protocol_green():
+    import pandas as pd
+
+    df = pd.DataFrame([["", "", "47204-11", "", "", "УВС-15Х", "", "1234"]])
+    assert RowColorEngine([NAME], ["47204-11 УВС-15Х.xlsx"]).compute(df) == [GREEN]